@@ -0,0 +1,210 @@
+import os
+import logging
+import functools
+import subprocess
+from io import BytesIO
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Turn the whole pre-STT stage off with AUDIO_PREP=0.
+AUDIO_PREP_ENABLED = os.environ.get("AUDIO_PREP", "1") == "1"
+SAMPLE_RATE = 16000
+# Codec sent to Whisper. flac is lossless and about half the size of 16 kHz WAV.
+# Without ffmpeg it is encoded with the FLAC binary bundled with
+# speech_recognition, and failing that WAV is used instead.
+STT_CODEC = os.environ.get("STT_CODEC", "flac")
+# Silence is anything this many dB below the recording's average loudness.
+SILENCE_OFFSET_DB = float(os.environ.get("STT_SILENCE_OFFSET_DB", "16"))
+# A pause must last this long to be a place where a long recording may be split.
+MIN_PAUSE_MS = int(os.environ.get("STT_MIN_PAUSE_MS", "400"))
+# Recordings longer than this are split into chunks of at most this length.
+MAX_CHUNK_MS = int(float(os.environ.get("STT_MAX_CHUNK_SECONDS", "45")) * 1000)
+# Never trim a recording down to less than this, so short answers like "yes" survive.
+MIN_KEEP_MS = 300
+
+
+@dataclass
+class PreparedAudio:
+    """Audio ready for upload: one or more (filename, bytes) chunks in playback order."""
+    chunks: list
+    duration_ms: int
+    codec: str
+
+    @property
+    def upload_bytes(self):
+        return sum(len(data) for _, data in self.chunks)
+
+
+@functools.lru_cache(maxsize=None)
+def has_ffmpeg():
+    from pydub.utils import which
+    return which("ffmpeg") is not None or which("avconv") is not None
+
+
+def load_audio(audio_file, format=None):
+    """
+    Decode a path or file-like object into a pydub AudioSegment.
+
+    Pass format for file-like objects: WAV is then read directly, without
+    ffmpeg or a temporary file.
+    """
+    from pydub import AudioSegment
+    return AudioSegment.from_file(audio_file, format=format)
+
+
+def normalize(segment):
+    """16 kHz, mono, 16-bit: everything Whisper needs and nothing more."""
+    return segment.set_channels(1).set_frame_rate(SAMPLE_RATE).set_sample_width(2)
+
+
+def _silence_threshold(segment):
+    # dBFS of pure digital silence is -inf; any finite threshold works then.
+    loudness = segment.dBFS if segment.dBFS != float("-inf") else -90.0
+    return loudness - SILENCE_OFFSET_DB
+
+
+def trim_silence(segment):
+    """Cut leading and trailing silence using a simple energy threshold."""
+    from pydub.silence import detect_leading_silence
+
+    threshold = _silence_threshold(segment)
+    start = detect_leading_silence(segment, silence_threshold=threshold, chunk_size=10)
+    end = len(segment) - detect_leading_silence(segment.reverse(), silence_threshold=threshold, chunk_size=10)
+    if end - start < MIN_KEEP_MS:
+        return segment
+    return segment[start:end]
+
+
+def split_at_pauses(segment, max_chunk_ms=None):
+    """
+    Split a long recording into chunks no longer than max_chunk_ms, cutting in
+    the middle of the last pause before the limit wherever there is one.
+    """
+    from pydub.silence import detect_silence
+
+    max_chunk_ms = max_chunk_ms or MAX_CHUNK_MS
+    if len(segment) <= max_chunk_ms:
+        return [segment]
+
+    pauses = detect_silence(segment, min_silence_len=MIN_PAUSE_MS,
+                            silence_thresh=_silence_threshold(segment), seek_step=10)
+    cut_points = [(start + end) // 2 for start, end in pauses]
+
+    chunks = []
+    chunk_start = 0
+    while len(segment) - chunk_start > max_chunk_ms:
+        limit = chunk_start + max_chunk_ms
+        candidates = [cut for cut in cut_points if chunk_start < cut <= limit]
+        # Fall back to a hard cut when someone talks without pausing.
+        cut = candidates[-1] if candidates else limit
+        chunks.append(segment[chunk_start:cut])
+        chunk_start = cut
+    chunks.append(segment[chunk_start:])
+    return chunks
+
+
+def _flac_without_ffmpeg(segment):
+    try:
+        import speech_recognition as sr
+        return sr.AudioData(segment.raw_data, segment.frame_rate, segment.sample_width).get_flac_data()
+    except Exception as e:
+        logger.warning(f"FLAC encoding failed, sending WAV: {e}")
+        return None
+
+
+# Codecs ffmpeg can write to a pipe, with the muxer to use. Others (e.g. m4a)
+# need a seekable output and go through pydub's temporary files.
+_PIPE_MUXERS = {"flac": "flac", "mp3": "mp3", "ogg": "ogg", "opus": "opus", "webm": "webm"}
+
+
+def _encode_with_ffmpeg(segment, codec):
+    # Raw PCM in on stdin, encoded audio out on stdout; nothing touches the disk.
+    from pydub.utils import get_encoder_name
+
+    sample_format = "u8" if segment.sample_width == 1 else f"s{8 * segment.sample_width}le"
+    command = [
+        get_encoder_name(), "-loglevel", "error",
+        "-f", sample_format, "-ar", str(segment.frame_rate), "-ac", str(segment.channels), "-i", "pipe:0",
+        "-f", _PIPE_MUXERS[codec], "pipe:1",
+    ]
+    try:
+        return subprocess.run(command, input=segment.raw_data, capture_output=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"ffmpeg {codec} encoding failed: {e}")
+        return None
+
+
+def export(segment, codec=None):
+    """
+    Encode a segment to (filename, bytes) in memory.
+
+    WAV is written by pydub directly and other pipeable codecs are piped
+    through ffmpeg (FLAC through speech_recognition's encoder without it), so
+    no temporary files are created. Codecs that can't be encoded that way fall
+    back to WAV without ffmpeg.
+    """
+    codec = codec or STT_CODEC
+    if codec != "wav":
+        data = None
+        if has_ffmpeg():
+            if codec not in _PIPE_MUXERS:
+                buffer = BytesIO()
+                segment.export(buffer, format=codec)
+                return f"audio.{codec}", buffer.getvalue()
+            data = _encode_with_ffmpeg(segment, codec)
+        if data is None and codec == "flac":
+            data = _flac_without_ffmpeg(segment)
+        if data is not None:
+            return f"audio.{codec}", data
+        codec = "wav"
+    buffer = BytesIO()
+    segment.export(buffer, format="wav")
+    return "audio.wav", buffer.getvalue()
+
+
+def decode_for_stt(audio_file, format=None):
+    """
+    Decode and normalize audio for transcription.
+
+    Args:
+        audio_file: Path or file-like object in any format ffmpeg can read
+            (WAV works without ffmpeg).
+        format: Container format of a file-like audio_file, e.g. "wav".
+
+    Returns:
+        The normalized AudioSegment, or None if preprocessing is disabled or the
+        audio could not be decoded, in which case the caller should upload the
+        original file.
+    """
+    if not AUDIO_PREP_ENABLED:
+        return None
+    try:
+        return normalize(load_audio(audio_file, format))
+    except Exception as e:
+        logger.warning(f"Audio decoding failed, sending original file: {e}")
+        return None
+
+
+def prepare_for_stt(audio_file=None, max_chunk_ms=None, codec=None, segment=None):
+    """
+    Resample to 16 kHz mono, trim silence and split long recordings at pauses.
+
+    Args:
+        audio_file: Path or file-like object, see decode_for_stt.
+        segment: An already decoded segment from decode_for_stt, used instead of audio_file.
+
+    Returns:
+        PreparedAudio, or None if the audio could not be decoded.
+    """
+    if segment is None:
+        segment = decode_for_stt(audio_file)
+        if segment is None:
+            return None
+    try:
+        segment = trim_silence(segment)
+        chunks = [export(chunk, codec) for chunk in split_at_pauses(segment, max_chunk_ms)]
+    except Exception as e:
+        logger.warning(f"Audio preprocessing failed, sending original file: {e}")
+        return None
+    return PreparedAudio(chunks=chunks, duration_ms=len(segment), codec=chunks[0][0].rsplit(".", 1)[1])
@@ -0,0 +1,182 @@
+"""
+Run many consultations offline through the same pipeline as the Gradio app.
+
+The manifest is a JSONL file with one case per line:
+
+    {"id": "case-1", "image": "acne-severe.jpg", "text": "Is this serious?", "language": "English"}
+    {"id": "case-2", "audio": "question.mp3", "language": "Hindi", "voice_service": "gTTS (Free)"}
+
+"audio" is transcribed like an uploaded file, "text" takes precedence over it as
+in the UI, "image" is optional. Results are appended to the output JSONL as soon
+as each case finishes, with per-stage timings, so an interrupted run can be
+restarted with --resume and only the missing cases are processed.
+
+    python batch.py cases.jsonl --output results.jsonl --concurrency 8
+    python batch.py cases.jsonl --output results.jsonl --resume
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            case = json.loads(line)
+            case.setdefault("id", f"line-{line_number}")
+            yield case
+
+
+def completed_ids(output_path, retry_errors=False):
+    """Ids already present in an earlier output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a half-written last line behind.
+                continue
+            if retry_errors and result.get("status") != "ok":
+                continue
+            done.add(result["id"])
+    return done
+
+
+def drop_partial_line(output_path):
+    """Cut a half-written last line off output_path so appended results start on a line of their own."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                position = position - step + newline + 1
+                break
+            position -= step
+        if position < size:
+            f.truncate(position)
+
+
+def run_case(case, base_dir):
+    from consultation import run_consultation
+
+    def resolve(path):
+        if not path:
+            return None
+        return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+    timings = {}
+    result = {"id": case["id"]}
+    start = time.perf_counter()
+    try:
+        transcript, doctor_response, audio_path = run_consultation(
+            recorded_audio=None,
+            uploaded_audio=resolve(case.get("audio")),
+            text_input=case.get("text"),
+            image_filepath=resolve(case.get("image")),
+            language_choice=case.get("language", "English"),
+            voice_service=case.get("voice_service", "gTTS (Free)"),
+            timings=timings
+        )
+        result.update({
+            "status": "ok",
+            "transcript": transcript,
+            "doctor_response": doctor_response,
+            "audio_path": audio_path,
+        })
+    except Exception as e:
+        result.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    timings.setdefault("total", time.perf_counter() - start)
+    result["timings"] = timings
+    return result
+
+
+def run_batch(cases, output_path, base_dir, concurrency):
+    """
+    Process cases with at most `concurrency` in flight and append each result
+    to output_path as soon as it is ready.
+
+    Returns:
+        (ok_count, error_count)
+    """
+    counts = {"ok": 0, "error": 0}
+    write_lock = threading.Lock()
+    cases = iter(cases)
+
+    drop_partial_line(output_path)
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        def record(result):
+            with write_lock:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                counts[result["status"]] += 1
+            print(f"[{result['status']}] {result['id']} {result['timings']['total']:.2f}s")
+
+        # Keep only a bounded window of futures so huge manifests are streamed, not loaded.
+        in_flight = set()
+        for case in cases:
+            in_flight.add(pool.submit(run_case, case, base_dir))
+            if len(in_flight) >= concurrency * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record(future.result())
+        for future in in_flight:
+            record(future.result())
+
+    return counts["ok"], counts["error"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="JSONL file of cases")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Cases processed at once")
+    parser.add_argument("--stt-concurrency", type=int, help="Limit on concurrent transcriptions")
+    parser.add_argument("--vision-concurrency", type=int, help="Limit on concurrent vision calls")
+    parser.add_argument("--tts-concurrency", type=int, help="Limit on concurrent TTS calls")
+    parser.add_argument("--audio-dir", default="batch_audio", help="Where reply audio is written")
+    parser.add_argument("--resume", action="store_true", help="Skip cases already in the output file")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, run failed cases again")
+    args = parser.parse_args(argv)
+
+    # Stage limits and the workspace are configured from the environment at import time.
+    for name, value in (("STT_CONCURRENCY", args.stt_concurrency),
+                        ("VISION_CONCURRENCY", args.vision_concurrency),
+                        ("TTS_CONCURRENCY", args.tts_concurrency)):
+        os.environ.setdefault(name, str(value or args.concurrency))
+    os.environ.setdefault("AI_DOCTOR_WORKSPACE", os.path.abspath(args.audio_dir))
+    os.environ.setdefault("ARTIFACT_MAX_AGE", "inf")
+    os.environ.setdefault("ARTIFACT_MAX_BYTES", str(2 ** 62))
+    os.environ.setdefault("AUDIO_PLAYBACK", "none")
+    # Let interactive Gradio traffic go ahead of batch work in the Groq rate limiter.
+    os.environ.setdefault("GROQ_PRIORITY", "batch")
+
+    skip = completed_ids(args.output, args.retry_errors) if args.resume else set()
+    cases = (case for case in read_manifest(args.manifest) if case["id"] not in skip)
+    base_dir = os.path.dirname(os.path.abspath(args.manifest))
+
+    start = time.perf_counter()
+    ok, errors = run_batch(cases, args.output, base_dir, args.concurrency)
+    elapsed = time.perf_counter() - start
+    total = ok + errors
+    print(f"{total} cases ({ok} ok, {errors} errors, {len(skip)} skipped) in {elapsed:.1f}s"
+          + (f", {total / elapsed:.2f} cases/s" if elapsed and total else ""))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Benchmark image preprocessing against sending the raw upload.
+
+For acne-severe.jpg and a few large synthetic photos this reports, for both the
+raw path (read + base64) and the preprocessed path (image_prep + base64):
+payload size, encode time, peak RSS of the encoding process and an end-to-end
+latency estimate (encode time + upload time at --upload-mbps). With --live the
+vision model is actually called and the measured round trip is reported instead.
+
+    python bench_image_prep.py
+    python bench_image_prep.py --upload-mbps 10 --live --output bench_image_prep.json
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import multiprocessing
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "acne-severe.jpg")
+SYNTHETIC_SIZES = [(3000, 4000), (4000, 6000), (6000, 8000)]
+
+
+def make_synthetic_image(path, size):
+    from PIL import Image, ImageFilter
+
+    # Noise blurred a little compresses roughly like a real photo.
+    img = Image.effect_noise(size, 60).filter(ImageFilter.GaussianBlur(1)).convert("RGB")
+    img.save(path, format="JPEG", quality=95)
+
+
+def peak_rss_kb():
+    # VmHWM is reset on exec, unlike ru_maxrss which keeps the parent's peak.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_case(mode, image_path, live, queue):
+    import brain
+
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    if mode == "raw":
+        with open(image_path, "rb") as f:
+            encoded_image = base64.b64encode(f.read()).decode("utf-8")
+        mime_type = "image/jpeg"
+    else:
+        encoded_image, mime_type = brain.encode_image_with_mime(image_path)
+    encode_seconds = time.perf_counter() - start
+    rss_after = peak_rss_kb()
+
+    result = {
+        "payload_bytes": len(encoded_image),
+        "mime_type": mime_type,
+        "encode_seconds": encode_seconds,
+        "peak_rss_kb": rss_after,
+        "peak_rss_delta_kb": rss_after - rss_before,
+    }
+    if live:
+        start = time.perf_counter()
+        brain.analyze_image_with_query(brain.query, brain.model, encoded_image, mime_type)
+        result["live_vision_seconds"] = time.perf_counter() - start
+    queue.put(result)
+
+
+def run_case(mode, image_path, live):
+    # Each case runs in a fresh process so peak RSS is not polluted by earlier cases.
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(mode, image_path, live, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--upload-mbps", type=float, default=20.0, help="Uplink bandwidth used for the latency estimate")
+    parser.add_argument("--live", action="store_true", help="Also call the vision model (needs GROQ_API_KEY)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [("acne-severe.jpg", SAMPLE_IMAGE)]
+        for width, height in SYNTHETIC_SIZES:
+            path = os.path.join(tmp, f"synthetic_{width}x{height}.jpg")
+            make_synthetic_image(path, (width, height))
+            cases.append((os.path.basename(path), path))
+
+        for name, path in cases:
+            for mode in ("raw", "preprocessed"):
+                result = run_case(mode, path, args.live)
+                upload_seconds = result["payload_bytes"] * 8 / (args.upload_mbps * 1_000_000)
+                result.update({
+                    "image": name,
+                    "mode": mode,
+                    "file_bytes": os.path.getsize(path),
+                    "estimated_end_to_end_seconds": result["encode_seconds"] + upload_seconds,
+                })
+                results.append(result)
+                print(f"{name:28} {mode:13} payload={result['payload_bytes'] / 1024:9.1f} KiB "
+                      f"encode={result['encode_seconds'] * 1000:8.1f} ms "
+                      f"rss+={result['peak_rss_delta_kb'] / 1024:7.1f} MiB "
+                      f"e2e~{result['estimated_end_to_end_seconds']:.2f} s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"upload_mbps": args.upload_mbps, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Measure cold-start cost of the Gradio app.
+
+Reports, over --runs fresh interpreters:
+  * import time of gradio_app (and which provider SDKs the import pulled in),
+  * time from process start until the server answers its first HTTP request.
+
+    python bench_startup.py --runs 5 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PROVIDER_MODULES = ("groq", "gtts", "elevenlabs", "speech_recognition", "pydub", "PIL")
+
+_IMPORT_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import gradio_app
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (PROVIDER_MODULES,)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(env):
+    output = subprocess.check_output([sys.executable, "-c", _IMPORT_PROBE], cwd=ROOT, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_first_request(env, timeout):
+    port = free_port()
+    env = dict(env, GRADIO_SERVER_PORT=str(port), GRADIO_SERVER_NAME="127.0.0.1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "gradio_app.py"], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"gradio_app.py exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"server did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        "runs": len(ordered),
+        "min_s": ordered[0],
+        "median_s": ordered[len(ordered) // 2],
+        "max_s": ordered[-1],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--skip-serve", action="store_true", help="Only measure import time")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # No warm-up calls or static audio synthesis: they would hit the real
+    # providers and skew the time to the first request.
+    env = dict(os.environ, GROQ_WARMUP="0", STATIC_AUDIO_WARMUP="0", GRADIO_ANALYTICS_ENABLED="False")
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    report = {
+        "import": summarize([run["seconds"] for run in imports]),
+        "providers_loaded_at_import": imports[-1]["loaded"],
+    }
+    print(f"import gradio_app: median {report['import']['median_s']:.3f}s "
+          f"(min {report['import']['min_s']:.3f}s), providers loaded: {report['providers_loaded_at_import']}")
+
+    if not args.skip_serve:
+        first_request = [measure_first_request(env, args.timeout) for _ in range(args.runs)]
+        report["first_request"] = summarize(first_request)
+        print(f"time to first served request: median {report['first_request']['median_s']:.3f}s "
+              f"(min {report['first_request']['min_s']:.3f}s)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
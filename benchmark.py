@@ -0,0 +1,232 @@
+"""
+Benchmark the pipeline stages against local provider stand-ins (see fakes.py).
+
+Measures encode_image, analyze_image_with_query, transcribe_with_groq,
+text_to_speech_multilingual (gTTS and ElevenLabs) and the full process_inputs
+pipeline for text, audio and image requests (called through run_consultation,
+so failures are counted instead of turned into reply text). For each it reports latency percentiles,
+throughput at the chosen concurrency and peak Python heap usage, and writes
+everything as JSON so two commits can be compared:
+
+    python benchmark.py --output before.json
+    git checkout my-branch
+    python benchmark.py --output after.json --compare before.json
+
+Caches are disabled so every iteration does the full work.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import struct
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_IMAGE = os.path.join(ROOT, "acne-severe.jpg")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = (len(ordered) - 1) * pct / 100
+    low = int(index)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (index - low)
+
+
+def summarize(latencies, wall_seconds, peak_bytes, errors):
+    return {
+        "iterations": len(latencies),
+        "errors": errors,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": max(latencies) * 1000 if latencies else 0.0,
+        "throughput_per_s": len(latencies) / wall_seconds if wall_seconds else 0.0,
+        "peak_heap_kb": peak_bytes / 1024,
+    }
+
+
+def measure(fn, iterations, concurrency):
+    """Call fn(i) `iterations` times across `concurrency` threads."""
+    latencies = []
+    errors = 0
+
+    def timed(i):
+        start = time.perf_counter()
+        fn(i)
+        return time.perf_counter() - start
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(timed, i) for i in range(iterations)]
+        for future in futures:
+            try:
+                latencies.append(future.result())
+            except Exception as e:
+                errors += 1
+                print(f"  error: {e}")
+    wall_seconds = time.perf_counter() - start
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(latencies, wall_seconds, peak_bytes, errors)
+
+
+def write_test_wav(path, seconds=5, rate=16000):
+    """A tone with a pause in the middle, so audio preprocessing has something to do."""
+    import math
+
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            t = i / rate
+            amplitude = 0 if seconds * 0.4 < t < seconds * 0.6 else 8000
+            frames += struct.pack("<h", int(amplitude * math.sin(2 * math.pi * 220 * t)))
+        wav.writeframes(bytes(frames))
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_targets(workdir, audio_path):
+    import brain
+    import voice
+    import consultation
+
+    encoded_image, mime_type = brain.encode_image_with_mime(SAMPLE_IMAGE)
+
+    def out(i, name):
+        return os.path.join(workdir, f"{name}_{i}.mp3")
+
+    return {
+        "encode_image": lambda i: brain.encode_image(SAMPLE_IMAGE),
+        "analyze_image_with_query": lambda i: brain.analyze_image_with_query(
+            brain.query, brain.model, encoded_image, mime_type),
+        "transcribe_with_groq": lambda i: voice.transcribe_with_groq(
+            stt_model=voice.stt_model, audio_filepath=audio_path, GROQ_API_KEY="fake-key"),
+        "text_to_speech_multilingual[gtts]": lambda i: consultation.text_to_speech_multilingual(
+            f"Reply number {i}. " + "Please keep the area clean. " * 4, out(i, "gtts"), language="hindi"),
+        "text_to_speech_multilingual[elevenlabs]": lambda i: consultation.text_to_speech_multilingual(
+            f"Reply number {i}. " + "Please keep the area clean. " * 4, out(i, "elevenlabs"), use_elevenlabs=True),
+        "process_inputs[text]": lambda i: consultation.run_consultation(
+            None, None, f"I have had a headache for {i} days", None, "English", "gTTS (Free)"),
+        "process_inputs[audio]": lambda i: consultation.run_consultation(
+            None, audio_path, None, None, "Hindi", "gTTS (Free)"),
+        "process_inputs[image]": lambda i: consultation.run_consultation(
+            None, None, f"Is this serious? ({i})", SAMPLE_IMAGE, "Marathi", "gTTS (Free)"),
+        "process_inputs[image+elevenlabs]": lambda i: consultation.run_consultation(
+            None, None, f"Is this serious? ({i})", SAMPLE_IMAGE, "English", "ElevenLabs (Premium)"),
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nComparison against {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    print(f"{'target':42} {'p50 Δ%':>9} {'p95 Δ%':>9} {'thr Δ%':>9}")
+    for name, stats in current["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            continue
+
+        def delta(key):
+            return (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+
+        print(f"{name:42} {delta('p50_ms'):+9.1f} {delta('p95_ms'):+9.1f} {delta('throughput_per_s'):+9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--groq-latency", type=float, default=0.5)
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--gtts-latency", type=float, default=0.4)
+    parser.add_argument("--elevenlabs-latency", type=float, default=0.6)
+    parser.add_argument("--response-chars", type=int, default=250)
+    parser.add_argument("--audio-bytes-per-char", type=int, default=200)
+    parser.add_argument("--only", action="append", help="Run only targets containing this text (repeatable)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="ai_doctor_bench_")
+    # Configure before the app modules are imported: no caches, no playback, no
+    # Groq rate limits (the stand-ins have none), private workspace and an empty
+    # static audio store.
+    os.environ.update({
+        "TTS_CACHE": "0",
+        "STT_CACHE": "0",
+        "GROQ_RATE_LIMIT": "0",
+        "RESPONSE_CACHE_SIZE": "0",
+        "AUDIO_PLAYBACK": "none",
+        "GROQ_WARMUP": "0",
+        "AI_DOCTOR_WORKSPACE": workdir,
+        "STATIC_AUDIO_DIR": os.path.join(workdir, "static_audio"),
+    })
+
+    import fakes
+
+    config = fakes.FakeConfig(
+        groq_latency=args.groq_latency,
+        stt_latency=args.stt_latency,
+        gtts_latency=args.gtts_latency,
+        elevenlabs_latency=args.elevenlabs_latency,
+        response_chars=args.response_chars,
+        audio_bytes_per_char=args.audio_bytes_per_char,
+    )
+    audio_path = os.path.join(workdir, "question.wav")
+    write_test_wav(audio_path)
+
+    results = {}
+    with fakes.installed(config):
+        targets = build_targets(workdir, audio_path)
+        for name, fn in targets.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            stats = measure(fn, args.iterations, args.concurrency)
+            results[name] = stats
+            print(f"{name:42} p50={stats['p50_ms']:8.1f}ms p95={stats['p95_ms']:8.1f}ms "
+                  f"p99={stats['p99_ms']:8.1f}ms thr={stats['throughput_per_s']:7.2f}/s "
+                  f"heap={stats['peak_heap_kb']:9.1f}KiB err={stats['errors']}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "fake_config": vars(config),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(report, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
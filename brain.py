@@ -5,41 +5,133 @@ GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
 
 import base64
 
+from image_prep import preprocess_image
+from metrics import span
 
 
-def encode_image(image_path):   
-    image_file=open(image_path, "rb")
-    return base64.b64encode(image_file.read()).decode('utf-8')
+def encode_image_with_mime(image_path, max_edge=None, quality=None):
+    """
+    Preprocess an image (see image_prep.preprocess_image) and base64-encode it.
 
+    Returns:
+        (encoded_image, mime_type)
+    """
+    with span("encode_image") as s:
+        image_bytes, mime_type=preprocess_image(image_path, max_edge=max_edge, quality=quality)
+        encoded_image=base64.b64encode(image_bytes).decode('utf-8')
+        s.set(payload_bytes=len(encoded_image), mime_type=mime_type)
+    return encoded_image, mime_type
 
-from groq import Groq
+
+def encode_image(image_path):
+    return encode_image_with_mime(image_path)[0]
+
+
+import ratelimit
+from groq_pool import get_groq_client, get_async_groq_client
 
 query="Is there something wrong with my face?"
 
 model="meta-llama/llama-4-scout-17b-16e-instruct"
 
 
-def analyze_image_with_query(query, model, encoded_image):
-    client=Groq()  
-    messages=[
+# Rough token cost of one vision call, charged to the rate limiter up front and
+# corrected from the response's usage where the API reports it.
+IMAGE_TOKEN_ESTIMATE=int(os.environ.get("GROQ_IMAGE_TOKENS", "1500"))
+RESPONSE_TOKEN_ESTIMATE=300
+
+
+def estimate_tokens(query):
+    return len(query) // 3 + IMAGE_TOKEN_ESTIMATE + RESPONSE_TOKEN_ESTIMATE
+
+
+def vision_budget(query, model):
+    """
+    admit callable for resilience.call: takes the rate budget of one vision
+    call, so the wait happens before the attempt's timeout starts.
+    """
+    return lambda wait: ratelimit.reserve(model, tokens=estimate_tokens(query), wait=wait)
+
+
+def vision_budget_async(query, model):
+    """vision_budget for resilience.acall."""
+    return lambda wait: ratelimit.areserve(model, tokens=estimate_tokens(query), wait=wait)
+
+
+def _total_tokens(chat_completion):
+    return getattr(getattr(chat_completion, "usage", None), "total_tokens", None)
+
+
+def build_messages(query, encoded_image, mime_type="image/jpeg"):
+    return [
         {
             "role": "user",
             "content": [
                 {
-                    "type": "text", 
+                    "type": "text",
                     "text": query
                 },
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/jpeg;base64,{encoded_image}",
+                        "url": f"data:{mime_type};base64,{encoded_image}",
                     },
                 },
             ],
         }]
-    chat_completion=client.chat.completions.create(
-        messages=messages,
-        model=model
-    )
 
-    return chat_completion.choices[0].message.content
\ No newline at end of file
+
+def analyze_image_with_query(query, model, encoded_image, mime_type="image/jpeg", budget=None):
+    """
+    budget: A ratelimit.Slot already taken for this call (see vision_budget);
+        by default the call waits for its own.
+    """
+    client=get_groq_client()
+    budget=budget or ratelimit.reserve(model, tokens=estimate_tokens(query))
+    with budget, span("vision", model=model, mode="sync") as s:
+        s.set(payload_bytes=len(encoded_image))
+        chat_completion=client.chat.completions.create(
+            messages=build_messages(query, encoded_image, mime_type),
+            model=model
+        )
+        budget.settle(_total_tokens(chat_completion))
+
+    return chat_completion.choices[0].message.content
+
+
+async def analyze_image_with_query_async(query, model, encoded_image, mime_type="image/jpeg", budget=None):
+    """
+    asyncio version of analyze_image_with_query using the pooled AsyncGroq client.
+    """
+    client=get_async_groq_client()
+    budget=budget or await ratelimit.areserve(model, tokens=estimate_tokens(query))
+    with budget:
+        with span("vision", model=model, mode="async") as s:
+            s.set(payload_bytes=len(encoded_image))
+            chat_completion=await client.chat.completions.create(
+                messages=build_messages(query, encoded_image, mime_type),
+                model=model
+            )
+        budget.settle(_total_tokens(chat_completion))
+
+    return chat_completion.choices[0].message.content
+
+
+def stream_image_with_query(query, model, encoded_image, mime_type="image/jpeg", budget=None):
+    """
+    Like analyze_image_with_query, but yields the response text piece by piece
+    as the model generates it.
+    """
+    client=get_groq_client()
+    budget=budget or ratelimit.reserve(model, tokens=estimate_tokens(query))
+    with budget, span("vision", model=model, mode="stream") as s:
+        s.set(payload_bytes=len(encoded_image))
+        stream=client.chat.completions.create(
+            messages=build_messages(query, encoded_image, mime_type),
+            model=model,
+            stream=True
+        )
+
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,279 @@
+import os
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">d")  # creation timestamp stored in front of every disk entry
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks so large uploads stay out of memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def ttl_from_env(name, default=None):
+    """Read a TTL in seconds from the environment; an empty value or 0 disables expiry."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if not value.strip():
+        return None
+    return float(value) or None
+
+
+def make_key(*parts):
+    """
+    Build a cache key from any number of str/bytes/None parts.
+
+    Parts are length-prefixed before hashing so ("ab", "c") and ("a", "bc")
+    never collide.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if part is None:
+            part = b""
+        elif not isinstance(part, bytes):
+            part = str(part).encode("utf-8")
+        digest.update(struct.pack(">Q", len(part)))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with an optional time-to-live.
+
+    Args:
+        max_entries: Number of entries kept before the least recently used is dropped.
+        ttl: Seconds an entry stays valid, or None to keep it until evicted.
+    """
+
+    def __init__(self, max_entries=256, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, created = item
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DiskCache:
+    """
+    Bounded on-disk byte store with LRU eviction, a TTL and atomic writes.
+
+    Entries are written to a temp file and renamed into place, so readers in
+    other threads or processes never see a partial file. Recency is tracked
+    through the file modification time, which is bumped on every hit.
+
+    Args:
+        directory: Where entries are stored. Created if missing.
+        max_bytes: Total size the store is trimmed back to after a write.
+        ttl: Seconds an entry stays valid, or None to keep it until evicted.
+        suffix: File extension of the entries, handy when they are media files.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl=None, suffix=".bin"):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key[:2], key + self.suffix)
+
+    def get(self, key):
+        path = self.path_for(key)
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_HEADER.size)
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(header) != _HEADER.size:
+            return None
+        created, = _HEADER.unpack(header)
+        if self.ttl is not None and time.time() - created > self.ttl:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key, data):
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(time.time()))
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        # Only rescan the directory when the running estimate says we may be over budget.
+        with self._lock:
+            if self._approx_bytes is not None:
+                self._approx_bytes += _HEADER.size + len(data)
+            needs_eviction = self._approx_bytes is None or self._approx_bytes > self.max_bytes
+        if needs_eviction:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(self.suffix):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            if self.ttl is not None:
+                for entry in list(entries):
+                    # mtime is never older than the creation time, so this only drops expired entries.
+                    if now - entry[0] > self.ttl:
+                        self._remove(entry[2])
+                        entries.remove(entry)
+                        total -= entry[1]
+
+            if total > self.max_bytes:
+                entries.sort()
+                for _, size, path in entries:
+                    if total <= self.max_bytes:
+                        break
+                    self._remove(path)
+                    total -= size
+            self._approx_bytes = total
+
+    def clear(self):
+        with self._lock:
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    self._remove(os.path.join(root, name))
+            self._approx_bytes = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional DiskCache, with hit/miss counters.
+
+    Args:
+        name: Used in stats output.
+        max_entries: Size of the memory tier.
+        ttl: Seconds an entry stays valid in either tier.
+        directory: Enables the disk tier when set.
+        max_disk_bytes: Size bound of the disk tier.
+        dumps/loads: Convert values to and from bytes for the disk tier.
+    """
+
+    def __init__(self, name, max_entries=256, ttl=None, directory=None,
+                 max_disk_bytes=256 * 1024 * 1024, dumps=None, loads=None):
+        self.name = name
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk = DiskCache(directory, max_bytes=max_disk_bytes, ttl=ttl) if directory else None
+        self.dumps = dumps or (lambda value: value.encode("utf-8"))
+        self.loads = loads or (lambda data: data.decode("utf-8"))
+        self._counts = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                self._counts[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("hits", "memory_hits")
+            return value
+        if self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                value = self.loads(data)
+                self.memory.set(key, value)
+                self._count("hits", "disk_hits")
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, self.dumps(value))
+            except OSError as e:
+                logger.warning(f"{self.name} cache: disk write failed: {e}")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
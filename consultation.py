@@ -0,0 +1,760 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import unicodedata
+import providers
+import resilience
+from cache_store import TieredCache, hash_file, make_key, ttl_from_env
+from streaming import iter_sentences, pipelined_speech, concatenate_mp3
+from static_audio import static_audio
+from playback import play_audio
+from workspace import workspace
+from stage_limits import stage_slot, astage_slot, limited
+from metrics import span, register_gauge, cache_gauge
+from singleflight import SingleFlight, Cancelled, flight_gauge
+
+logger = logging.getLogger(__name__)
+
+lang_codes = {
+    'english': 'en',
+    'hindi': 'hi', 
+    'marathi': 'mr'
+}
+
+# Stream the vision response and synthesize it sentence by sentence.
+STREAMING_MODE = os.environ.get("AI_DOCTOR_STREAMING", "0") == "1"
+
+
+def _resilient_synthesis(provider_name, synthesize, text, output_filepath):
+    # Every attempt writes its own file. Only the first to finish while the
+    # call is still waiting is moved into place: attempts that lost a hedge or
+    # timed out are not interrupted, and must not overwrite the output (or a
+    # fallback's output) when they finish later.
+    lock = threading.Lock()
+    state = {"open": True}
+
+    def attempt():
+        part_path = f"{output_filepath}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            synthesize(text, part_path)
+            with lock:
+                if state["open"] and os.path.exists(part_path):
+                    os.replace(part_path, output_filepath)
+                    state["open"] = False
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    try:
+        resilience.call(provider_name, attempt)
+    finally:
+        with lock:
+            state["open"] = False
+
+
+def synthesize_speech(input_text, output_filepath, language, use_elevenlabs=False, fallback=True):
+    """
+    Synthesize speech without playing it, with timeouts, retries and hedging
+    (see resilience). If ElevenLabs fails or its circuit breaker is open, gTTS
+    is used instead, unless fallback is False.
+
+    Returns:
+        The engine that produced the audio, "elevenlabs" or "gtts".
+    """
+    if use_elevenlabs:
+        try:
+            _resilient_synthesis("elevenlabs", providers.get("tts.elevenlabs"), input_text, output_filepath)
+            return "elevenlabs"
+        except Exception as e:
+            if not fallback:
+                raise
+            logger.warning(f"ElevenLabs failed ({e}), falling back to gTTS")
+
+    lang_code = lang_codes.get(language, 'en')
+    gtts = providers.get("tts.gtts")
+    _resilient_synthesis(
+        "gtts", lambda text, path: gtts(text, path, language=lang_code), input_text, output_filepath
+    )
+    return "gtts"
+
+
+def speech_synthesizer(language, use_elevenlabs=False, fallback=True):
+    """Return a (text, output_filepath) callable that only synthesizes, without playback."""
+    return lambda text, path: synthesize_speech(text, path, language, use_elevenlabs, fallback)
+
+
+def stream_speech(input_text, output_filepath, language, use_elevenlabs=False):
+    """
+    Yield the reply audio as MP3 chunks while it is synthesized.
+
+    ElevenLabs audio is streamed chunk by chunk as it arrives. gTTS, and the
+    fallback to it when ElevenLabs fails before sending anything or its circuit
+    breaker is open, yields the whole clip at once. output_filepath holds the
+    complete clip afterwards.
+    """
+    if use_elevenlabs:
+        breaker = resilience.provider("elevenlabs").breaker
+        if breaker.allow():
+            started = False
+            try:
+                for chunk in providers.get("tts.elevenlabs.stream")(input_text, output_filepath):
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                # The listener went away; ElevenLabs itself was fine.
+                breaker.record_success()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                if started:
+                    raise
+                logger.warning(f"ElevenLabs streaming failed ({e}), falling back to gTTS")
+            else:
+                breaker.record_success()
+                return
+
+    synthesize_speech(input_text, output_filepath, language, use_elevenlabs=False)
+    yield from _file_chunks(output_filepath)
+
+
+def _file_chunks(path):
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            yield f.read()
+
+
+def text_to_speech_multilingual(input_text, output_filepath, language='en', use_elevenlabs=False):
+    """
+    Enhanced text-to-speech with Hindi and Marathi support
+    
+    Args:
+        input_text: Text to convert to speech
+        output_filepath: Path to save audio file
+        language: Language code ('en', 'hi', 'mr')
+        use_elevenlabs: Whether to use ElevenLabs (True) or gTTS (False);
+            falls back to gTTS when ElevenLabs is unavailable
+    """
+    try:
+        synthesize_speech(input_text, output_filepath, language, use_elevenlabs)
+        play_audio(output_filepath)
+
+    except Exception as e:
+        print(f"Error in multilingual TTS: {e}")
+        return None
+
+
+vision_model = "meta-llama/llama-4-scout-17b-16e-instruct"
+
+# Doctor responses keyed on image + prompt + query + language + model.
+# Set RESPONSE_CACHE_DIR to also keep them on disk across restarts.
+response_cache = TieredCache(
+    "response",
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "512")),
+    ttl=ttl_from_env("RESPONSE_CACHE_TTL", 86400),
+    directory=os.environ.get("RESPONSE_CACHE_DIR") or None,
+    max_disk_bytes=int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+)
+register_gauge("ai_doctor_response_cache", cache_gauge(response_cache))
+
+
+system_prompts = {
+    'english': """You have to act as a professional doctor, i know you are not but this is for learning purpose.
+             What's in this image?. Do you find anything wrong with it medically?
+             If you make a differential, suggest some remedies for them. Donot add any numbers or special characters in
+             your response. Your response should be in one long paragraph. Also always answer as if you are answering to a real person.
+            Donot say 'In the image I see' but say 'With what I see, I think you have ....'
+            Dont respond as an AI model in markdown, your answer should mimic that of an actual doctor not an AI bot,
+             Keep your answer concise (max 2 sentences). No preamble, start your answer right away please""",
+    
+    'hindi': """आपको एक पेशेवर डॉक्टर की तरह काम करना है, मुझे पता है कि आप नहीं हैं लेकिन यह सीखने के उद्देश्य से है।
+             इस तस्वीर में क्या है? क्या आपको इसमें चिकित्सा की दृष्टि से कुछ गलत लगता है?
+             यदि आप कोई निदान करते हैं, तो उसके लिए कुछ उपचार सुझाएं। अपने उत्तर में कोई संख्या या विशेष वर्ण न जोड़ें।
+             आपका उत्तर एक लंबे पैराग्राफ में होना चाहिए। हमेशा ऐसे उत्तर दें जैसे आप किसी वास्तविक व्यक्ति को जवाब दे रहे हों।
+             'तस्वीर में मुझे दिखता है' न कहें बल्कि 'जो मुझे दिखता है, मुझे लगता है कि आपको... है'
+             AI मॉडल की तरह मार्कडाउन में जवाब न दें, आपका उत्तर वास्तविक डॉक्टर का होना चाहिए न कि AI बॉट का।
+             अपना उत्तर संक्षिप्त रखें (अधिकतम 2 वाक्य)। कोई प्रस्तावना नहीं, अपना उत्तर तुरंत शुरू करें। हिंदी में उत्तर दें।""",
+    
+    'marathi': """तुम्हाला एक व्यावसायिक डॉक्टर म्हणून काम करावे लागेल, मला माहित आहे की तुम्ही नाही पण हे शिकण्याच्या उद्देशाने आहे।
+             या चित्रात काय आहे? तुम्हाला यात वैद्यकीय दृष्टीने काही चुकीचं वाटतं का?
+             जर तुम्ही निदान करता तर त्यासाठी काही उपचार सुचवा. तुमच्या उत्तरात कोणतेही संख्या किंवा विशेष वर्ण जोडू नका.
+             तुमचे उत्तर एका लांब परिच्छेदात असावे. नेहमी असे उत्तर द्या जसे तुम्ही खऱ्या व्यक्तीला उत्तर देत आहात.
+             'चित्रात मला दिसतं' असं म्हणू नका तर 'जे मला दिसतं त्यावरून मला वाटतं तुम्हाला... आहे'
+             AI मॉडेल सारखं मार्कडाउनमध्ये उत्तर देऊ नका, तुमचं उत्तर खऱ्या डॉक्टरासारखं असावं.
+             तुमचं उत्तर थोडक्यात ठेवा (जास्तीत जास्त 2 वाक्य). कोणतीही प्रस्तावना नाही, लगेच उत्तर सुरू करा. मराठीत उत्तर द्या."""
+}
+
+no_input_messages = {
+    'english': "Please provide a question via text, recorded audio, or uploaded audio file.",
+    'hindi': "कृपया टेक्स्ट, रिकॉर्ड की गई ऑडियो, या अपलोड की गई ऑडियो फ़ाइल के द्वारा प्रश्न दें।",
+    'marathi': "कृपया मजकूर, रेकॉर्ड केलेला ऑडिओ किंवा अपलोड केलेल्या ऑडिओ फाइलद्वारे प्रश्न द्या."
+}
+
+no_image_messages = {
+    'english': "No image provided for me to analyze. Please describe your symptoms or upload a medical image.",
+    'hindi': "विश्लेषण के लिए कोई छवि प्रदान नहीं की गई। कृपया अपने लक्षणों का वर्णन करें या चिकित्सा छवि अपलोड करें।",
+    'marathi': "विश्लेषणासाठी कोणतीही प्रतिमा दिली नाही. कृपया तुमच्या लक्षणांचे वर्णन करा किंवा वैद्यकीय प्रतिमा अपलोड करा."
+}
+
+# Filled in with the user's question via str.format(user_query=...).
+text_only_prompts = {
+    'english': "As a doctor, based on the symptoms or question: '{user_query}', provide a brief medical consultation response. Keep it concise and suggest seeing a healthcare professional for proper diagnosis.",
+    'hindi': "एक डॉक्टर के रूप में, लक्षणों या प्रश्न के आधार पर: '{user_query}', एक संक्षिप्त चिकित्सा परामर्श प्रतिक्रिया प्रदान करें। इसे संक्षिप्त रखें और उचित निदान के लिए स्वास्थ्य सेवा पेशेवर से मिलने का सुझाव दें।",
+    'marathi': "डॉक्टर म्हणून, लक्षणे किंवा प्रश्नाच्या आधारे: '{user_query}', थोडक्यात वैद्यकीय सल्ला द्या. योग्य निदानासाठी आरोग्य सेवा व्यावसायिकाला भेटण्याचा सल्ला द्या."
+}
+
+stt_model = "whisper-large-v3"
+ELEVENLABS_CHOICE = "ElevenLabs (Premium)"
+
+# Identical requests in flight at the same time (double submits, several staff
+# on one shared image) run once and share the result. See request_key.
+SINGLE_FLIGHT = os.environ.get("SINGLE_FLIGHT", "1") == "1"
+consultations = SingleFlight("consultation")
+register_gauge("ai_doctor_single_flight", flight_gauge(consultations))
+
+
+def _template_parts(template):
+    # The fixed text either side of {user_query}, without the quotes around it.
+    prefix, suffix = template.split("{user_query}")
+    return prefix.rstrip(" '\""), suffix.lstrip(" ',\"")
+
+
+def static_messages():
+    """(text, language) of every fixed reply, including the fixed parts of text_only_prompts."""
+    for language in lang_codes:
+        yield no_input_messages[language], language
+        yield no_image_messages[language], language
+        for part in _template_parts(text_only_prompts[language]):
+            yield part, language
+
+
+def build_static_audio(rebuild=False):
+    """
+    Pre-synthesize every static message for each language and voice engine
+    into the static audio store. ElevenLabs clips are only built when an API
+    key is configured.
+    """
+    synthesizers = {
+        "gtts": lambda text, path, language: providers.get("tts.gtts")(text, path, language=lang_codes[language])
+    }
+    if os.environ.get("ELEVENLABS_API_KEY"):
+        synthesizers["elevenlabs"] = lambda text, path, language: providers.get("tts.elevenlabs")(text, path)
+    entries = [(text, language, engine) for text, language in static_messages() for engine in synthesizers]
+    counts = static_audio.build(entries, synthesizers, rebuild=rebuild)
+    logger.info(f"Static audio in {static_audio.root}: {counts}")
+    return counts
+
+
+def static_reply_audio(user_query, language, use_elevenlabs, output_audio_path):
+    """
+    Audio for the replies that don't come from the vision model, assembled from
+    the static audio store. Only the user's question in a text-only reply is
+    synthesized; it is stitched between the pre-built parts of the template.
+
+    Callers hold the "tts" stage slot.
+
+    Returns:
+        Path of the audio, or None if the store doesn't have the clips.
+    """
+    engine = "elevenlabs" if use_elevenlabs else "gtts"
+    if not user_query:
+        return static_audio.get(no_image_messages.get(language, no_image_messages['english']), language, engine)
+
+    template = text_only_prompts.get(language, text_only_prompts['english'])
+    prefix, suffix = _template_parts(template)
+    if not (static_audio.get(prefix, language, engine) and static_audio.get(suffix, language, engine)):
+        return None
+
+    query_path = workspace.new_path(prefix="query")
+    try:
+        engine = synthesize_speech(user_query, query_path, language, use_elevenlabs)
+        # After a fallback to gTTS, stitch with the gTTS clips so the sample rate matches.
+        parts = [static_audio.get(prefix, language, engine), query_path, static_audio.get(suffix, language, engine)]
+        if not all(parts) or not os.path.exists(query_path):
+            return None
+        concatenate_mp3(parts, output_audio_path)
+    finally:
+        if os.path.exists(query_path):
+            os.remove(query_path)
+    return output_audio_path
+
+
+def no_input_audio(language, use_elevenlabs):
+    """Pre-built clip of the no-input message, or None."""
+    message = no_input_messages.get(language, no_input_messages['english'])
+    return static_audio.get(message, language, "elevenlabs" if use_elevenlabs else "gtts")
+
+
+def transcribe_input(recorded_audio, uploaded_audio, text_input):
+    """
+    Turn whichever input the user gave into a query.
+
+    Text wins over recorded audio, which wins over uploaded audio.
+
+    Returns:
+        (speech_to_text_output, user_query), or (None, "") if there is no input.
+    """
+    if text_input and text_input.strip():
+        user_query = text_input.strip()
+        return f"Text input: {user_query}", user_query
+
+    audio_filepath = recorded_audio or uploaded_audio
+    if not audio_filepath:
+        return None, ""
+
+    with stage_slot("stt"):
+        speech_to_text_output = _speech_to_text(audio_filepath)
+    return speech_to_text_output, speech_to_text_output
+
+
+async def transcribe_input_async(recorded_audio, uploaded_audio, text_input):
+    """transcribe_input for the event loop; the Groq call runs in a worker thread."""
+    audio_filepath = None if text_input and text_input.strip() else recorded_audio or uploaded_audio
+    if not audio_filepath:
+        return transcribe_input(None, None, text_input)
+
+    async with astage_slot("stt"):
+        speech_to_text_output = await asyncio.to_thread(_speech_to_text, audio_filepath)
+    return speech_to_text_output, speech_to_text_output
+
+
+def _speech_to_text(audio_filepath):
+    # Timeouts and retries apply to each chunk upload (see voice._transcribe_upload).
+    return providers.get("stt.groq")(
+        GROQ_API_KEY=os.environ.get("GROQ_API_KEY"),
+        audio_filepath=audio_filepath,
+        stt_model=stt_model
+    )
+
+
+def _vision_stream(query, encoded_image, mime_type):
+    """
+    Text pieces of the vision response as they are generated. Getting the first
+    piece runs under the groq-vision policy (timeout, retries, hedging, rate
+    budget); a failure after that can't be retried, but still counts against
+    the breaker.
+    """
+    def first_piece(budget):
+        pieces = providers.get("vision.groq.stream")(
+            query=query,
+            encoded_image=encoded_image,
+            mime_type=mime_type,
+            model=vision_model,
+            budget=budget
+        )
+        return next(pieces, ""), pieces
+
+    first, pieces = resilience.call(
+        "groq-vision", first_piece, admit=providers.get("vision.groq.budget")(query, vision_model)
+    )
+    if first:
+        yield first
+    try:
+        yield from pieces
+    except Exception:
+        resilience.provider("groq-vision").breaker.record_failure()
+        raise
+
+
+def doctor_reply(user_query, image_filepath, language, use_elevenlabs, output_audio_path):
+    """
+    Produce the doctor's response text.
+
+    In streaming mode the reply audio is synthesized while the response is
+    generated, in which case speech_done is True and output_audio_path is
+    already written.
+
+    Returns:
+        (doctor_response, speech_done)
+    """
+    if not image_filepath:
+        if user_query:
+            template = text_only_prompts.get(language, text_only_prompts['english'])
+            return template.format(user_query=user_query), False
+        return no_image_messages.get(language, no_image_messages['english']), False
+
+    system_prompt = system_prompts.get(language, system_prompts['english'])
+    cache_key = make_key(hash_file(image_filepath), system_prompt, user_query, language, vision_model)
+    doctor_response = response_cache.get(cache_key)
+    if doctor_response is not None:
+        with span("vision", model=vision_model, mode="cache") as s:
+            s.set(outcome="cache_hit")
+        return doctor_response, False
+
+    encoded_image, mime_type = providers.get("vision.encode_image")(image_filepath)
+    if STREAMING_MODE:
+        with stage_slot("vision"):
+            doctor_response = pipelined_speech(
+                iter_sentences(_vision_stream(system_prompt + " " + user_query, encoded_image, mime_type)),
+                output_filepath=output_audio_path,
+                # No per-sentence fallback: segments from two engines (and
+                # sample rates) can't be byte-joined into one clip.
+                synthesize=limited("tts", speech_synthesizer(language, use_elevenlabs, fallback=False))
+            )
+        response_cache.set(cache_key, doctor_response)
+        # If a sentence failed there is no audio yet; the caller synthesizes
+        # the whole reply, with the usual fallback, as in non-streaming mode.
+        return doctor_response, os.path.exists(output_audio_path)
+
+    with stage_slot("vision"):
+        doctor_response = resilience.call(
+            "groq-vision",
+            providers.get("vision.groq"),
+            query=system_prompt + " " + user_query,
+            encoded_image=encoded_image,
+            mime_type=mime_type,
+            model=vision_model,
+            admit=providers.get("vision.groq.budget")(system_prompt + " " + user_query, vision_model)
+        )
+    response_cache.set(cache_key, doctor_response)
+    return doctor_response, False
+
+
+async def doctor_reply_async(user_query, image_filepath, language, use_elevenlabs, output_audio_path):
+    """
+    doctor_reply for the event loop. The vision call goes through the async
+    Groq client; hashing and encoding the image run in worker threads. The
+    paths without a vision call, and streaming mode, run doctor_reply in a thread.
+    """
+    if not image_filepath or STREAMING_MODE:
+        return await asyncio.to_thread(doctor_reply, user_query, image_filepath, language, use_elevenlabs, output_audio_path)
+
+    system_prompt = system_prompts.get(language, system_prompts['english'])
+    image_hash = await asyncio.to_thread(hash_file, image_filepath)
+    cache_key = make_key(image_hash, system_prompt, user_query, language, vision_model)
+    doctor_response = response_cache.get(cache_key)
+    if doctor_response is not None:
+        with span("vision", model=vision_model, mode="cache") as s:
+            s.set(outcome="cache_hit")
+        return doctor_response, False
+
+    encoded_image, mime_type = await asyncio.to_thread(providers.get("vision.encode_image"), image_filepath)
+    async with astage_slot("vision"):
+        doctor_response = await resilience.acall(
+            "groq-vision",
+            providers.get("vision.groq.async"),
+            query=system_prompt + " " + user_query,
+            encoded_image=encoded_image,
+            mime_type=mime_type,
+            model=vision_model,
+            admit=providers.get("vision.groq.budget.async")(system_prompt + " " + user_query, vision_model)
+        )
+    response_cache.set(cache_key, doctor_response)
+    return doctor_response, False
+
+
+def speak_reply(doctor_response, output_audio_path, language, use_elevenlabs):
+    with stage_slot("tts"):
+        text_to_speech_multilingual(
+            input_text=doctor_response,
+            output_filepath=output_audio_path,
+            language=language,
+            use_elevenlabs=use_elevenlabs
+        )
+    return output_audio_path if os.path.exists(output_audio_path) else None
+
+
+def run_consultation(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service, timings=None):
+    """
+    Run STT -> vision -> TTS for one request. Errors are raised, not swallowed.
+
+    Args:
+        timings: Optional dict that receives the seconds spent in the "stt",
+            "vision" and "tts" stages and in "total".
+
+    Returns:
+        (speech_to_text_output, doctor_response, output_audio_path or None)
+    """
+    timings = {} if timings is None else timings
+    language = language_choice.lower()
+    use_elevenlabs = (voice_service == ELEVENLABS_CHOICE)
+    start = time.perf_counter()
+
+    speech_to_text_output, user_query = transcribe_input(recorded_audio, uploaded_audio, text_input)
+    timings["stt"] = time.perf_counter() - start
+    if speech_to_text_output is None:
+        error_msg = no_input_messages.get(language, no_input_messages['english'])
+        timings["total"] = timings["stt"]
+        return error_msg, error_msg, no_input_audio(language, use_elevenlabs)
+
+    mark = time.perf_counter()
+    output_audio_path = workspace.new_path(prefix=f"doctor_response_{language}")
+    doctor_response, speech_done = doctor_reply(user_query, image_filepath, language, use_elevenlabs, output_audio_path)
+    timings["vision"] = time.perf_counter() - mark
+
+    mark = time.perf_counter()
+    if speech_done:
+        audio_path = output_audio_path if os.path.exists(output_audio_path) else None
+    else:
+        audio_path = None
+        if not image_filepath:
+            with stage_slot("tts"):
+                audio_path = static_reply_audio(user_query, language, use_elevenlabs, output_audio_path)
+        if audio_path:
+            play_audio(audio_path)
+        else:
+            audio_path = speak_reply(doctor_response, output_audio_path, language, use_elevenlabs)
+    timings["tts"] = time.perf_counter() - mark
+    timings["total"] = time.perf_counter() - start
+
+    return speech_to_text_output, doctor_response, audio_path
+
+
+def request_key(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service):
+    """
+    Identity of a consultation request for single-flight coalescing: the
+    normalized question (or a hash of the audio it will be transcribed from),
+    the image hash, the language and the voice service.
+    """
+    if text_input and text_input.strip():
+        question = unicodedata.normalize("NFC", " ".join(text_input.split()))
+    elif recorded_audio or uploaded_audio:
+        question = "audio:" + hash_file(recorded_audio or uploaded_audio)
+    else:
+        question = ""
+    image_hash = hash_file(image_filepath) if image_filepath else ""
+    return make_key(question, image_hash, language_choice.lower(), voice_service)
+
+
+def process_inputs(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service):
+    """
+    Process inputs from multiple sources: recorded audio, uploaded audio, or text input
+
+    Identical requests arriving while one is running share its result.
+    """
+    try:
+        with span("consultation", language=language_choice.lower()):
+            run = lambda: run_consultation(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service)
+            if not SINGLE_FLIGHT:
+                return run()
+            key = request_key(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service)
+            return consultations.do(key, run)
+    except Exception as e:
+        logger.exception("process_inputs failed")
+        error_msg = f"Error processing: {str(e)}"
+        return error_msg, error_msg, None
+
+
+def _stream_reply(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service, outcome):
+    # Body of stream_consultation. Leaves (speech_to_text_output, doctor_response,
+    # audio path or None) in outcome["result"] for single-flight followers.
+    language = language_choice.lower()
+    use_elevenlabs = (voice_service == ELEVENLABS_CHOICE)
+
+    speech_to_text_output, user_query = transcribe_input(recorded_audio, uploaded_audio, text_input)
+    if speech_to_text_output is None:
+        error_msg = no_input_messages.get(language, no_input_messages['english'])
+        audio_path = no_input_audio(language, use_elevenlabs)
+        outcome["result"] = (error_msg, error_msg, audio_path)
+        yield error_msg, error_msg, None
+        if audio_path:
+            for chunk in _file_chunks(audio_path):
+                yield error_msg, error_msg, chunk
+        return
+
+    output_audio_path = workspace.new_path(prefix=f"doctor_response_{language}")
+    doctor_response, speech_done = doctor_reply(user_query, image_filepath, language, use_elevenlabs, output_audio_path)
+    yield speech_to_text_output, doctor_response, None
+
+    static_path = None
+    if not (speech_done or image_filepath):
+        with stage_slot("tts"):
+            static_path = static_reply_audio(user_query, language, use_elevenlabs, output_audio_path)
+    if speech_done:
+        chunks = _file_chunks(output_audio_path)
+    elif static_path:
+        chunks = _file_chunks(static_path)
+    else:
+        chunks = stream_speech(doctor_response, output_audio_path, language, use_elevenlabs)
+    with stage_slot("tts"):
+        for chunk in chunks:
+            yield speech_to_text_output, doctor_response, chunk
+
+    audio_path = static_path or (output_audio_path if os.path.exists(output_audio_path) else None)
+    outcome["result"] = (speech_to_text_output, doctor_response, audio_path)
+
+
+def stream_consultation(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service):
+    """
+    process_inputs for a streaming gr.Audio output.
+
+    Yields (speech_to_text_output, doctor_response, audio_chunk): first with no
+    audio as soon as the text is ready, then once per MP3 chunk, so playback
+    starts with the first chunk instead of after the whole clip is synthesized.
+
+    A request identical to one already running waits for it and then gets the
+    finished reply in one piece.
+    """
+    inputs = (recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service)
+    outcome = {}
+    try:
+        with span("consultation", language=language_choice.lower(), mode="stream"):
+            if not SINGLE_FLIGHT:
+                yield from _stream_reply(*inputs, outcome)
+                return
+
+            key = request_key(*inputs)
+            while True:
+                flight, leader = consultations.join(key)
+                if leader:
+                    break
+                try:
+                    speech_to_text_output, doctor_response, audio_path = flight.wait()
+                except Cancelled:
+                    continue
+                yield speech_to_text_output, doctor_response, None
+                for chunk in _file_chunks(audio_path) if audio_path else []:
+                    yield speech_to_text_output, doctor_response, chunk
+                return
+
+            try:
+                yield from _stream_reply(*inputs, outcome)
+            except BaseException as e:
+                consultations.finish(key, flight, error=e if isinstance(e, Exception) else Cancelled())
+                raise
+            consultations.finish(key, flight, result=outcome.get("result"))
+    except Exception as e:
+        logger.exception("stream_consultation failed")
+        error_msg = f"Error processing: {str(e)}"
+        yield error_msg, error_msg, None
+
+
+async def _iterate_in_thread(generator):
+    # Pull each item of a blocking generator in a worker thread. It is closed
+    # in a worker thread too, once a next() still running there (the caller
+    # was cancelled mid-item) has returned; the caller doesn't wait for that.
+    done = object()
+    lock = threading.Lock()
+
+    def step():
+        with lock:
+            return next(generator, done)
+
+    def close():
+        with lock:
+            generator.close()
+
+    try:
+        while True:
+            item = await asyncio.to_thread(step)
+            if item is done:
+                return
+            yield item
+    finally:
+        asyncio.get_running_loop().run_in_executor(None, close)
+
+
+async def _audio_outputs(audio_path, stream_audio):
+    if not audio_path:
+        return
+    if not stream_audio:
+        yield audio_path
+        return
+    for chunk in await asyncio.to_thread(lambda: list(_file_chunks(audio_path))):
+        yield chunk
+
+
+async def _reply_async(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service,
+                       stream_audio, outcome):
+    # Body of the async handlers; leaves the final outputs in outcome["result"]
+    # for single-flight followers, like _stream_reply.
+    language = language_choice.lower()
+    use_elevenlabs = (voice_service == ELEVENLABS_CHOICE)
+
+    speech_to_text_output, user_query = await transcribe_input_async(recorded_audio, uploaded_audio, text_input)
+    if speech_to_text_output is None:
+        error_msg = no_input_messages.get(language, no_input_messages['english'])
+        audio_path = no_input_audio(language, use_elevenlabs)
+        outcome["result"] = (error_msg, error_msg, audio_path)
+        yield error_msg, error_msg, None
+        async for audio in _audio_outputs(audio_path, stream_audio):
+            yield error_msg, error_msg, audio
+        return
+    yield speech_to_text_output, "", None
+
+    output_audio_path = workspace.new_path(prefix=f"doctor_response_{language}")
+    doctor_response, speech_done = await doctor_reply_async(user_query, image_filepath, language, use_elevenlabs, output_audio_path)
+    yield speech_to_text_output, doctor_response, None
+
+    audio_path = None
+    if speech_done:
+        audio_path = output_audio_path if os.path.exists(output_audio_path) else None
+    elif not image_filepath:
+        async with astage_slot("tts"):
+            audio_path = await asyncio.to_thread(static_reply_audio, user_query, language, use_elevenlabs, output_audio_path)
+
+    if audio_path is None and not speech_done:
+        if stream_audio:
+            async with astage_slot("tts"):
+                async for chunk in _iterate_in_thread(stream_speech(doctor_response, output_audio_path, language, use_elevenlabs)):
+                    yield speech_to_text_output, doctor_response, chunk
+            audio_path = output_audio_path if os.path.exists(output_audio_path) else None
+            outcome["result"] = (speech_to_text_output, doctor_response, audio_path)
+            return
+        async with astage_slot("tts"):
+            await asyncio.to_thread(text_to_speech_multilingual, input_text=doctor_response, output_filepath=output_audio_path,
+                                    language=language, use_elevenlabs=use_elevenlabs)
+        audio_path = output_audio_path if os.path.exists(output_audio_path) else None
+
+    outcome["result"] = (speech_to_text_output, doctor_response, audio_path)
+    async for audio in _audio_outputs(audio_path, stream_audio):
+        yield speech_to_text_output, doctor_response, audio
+
+
+async def _consultation_async(inputs, stream_audio):
+    outcome = {}
+    try:
+        with span("consultation", language=inputs[4].lower(), mode="async"):
+            flight = None
+            if SINGLE_FLIGHT:
+                key = await asyncio.to_thread(request_key, *inputs)
+                while True:
+                    flight, leader = consultations.join(key)
+                    if leader:
+                        break
+                    try:
+                        speech_to_text_output, doctor_response, audio_path = await flight.wait_async()
+                    except Cancelled:
+                        continue
+                    yield speech_to_text_output, doctor_response, None
+                    async for audio in _audio_outputs(audio_path, stream_audio):
+                        yield speech_to_text_output, doctor_response, audio
+                    return
+
+            try:
+                async for outputs in _reply_async(*inputs, stream_audio, outcome):
+                    yield outputs
+            except BaseException as e:
+                if flight is not None:
+                    consultations.finish(key, flight, error=e if isinstance(e, Exception) else Cancelled())
+                raise
+            if flight is not None:
+                consultations.finish(key, flight, result=outcome.get("result"))
+    except Exception as e:
+        logger.exception("async consultation failed")
+        error_msg = f"Error processing: {str(e)}"
+        yield error_msg, error_msg, None
+
+
+async def process_inputs_async(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service):
+    """
+    Async generator version of process_inputs.
+
+    Yields (speech_to_text_output, doctor_response, audio_path) as results come
+    in: the transcript once STT finishes, then the doctor's text, then the
+    audio. The vision call uses the async Groq client and the other blocking
+    provider calls run in worker threads, so a request waiting on a provider
+    holds no Gradio worker thread.
+    """
+    inputs = (recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service)
+    async for outputs in _consultation_async(inputs, stream_audio=False):
+        yield outputs
+
+
+async def stream_consultation_async(recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service):
+    """process_inputs_async for a streaming gr.Audio output: the audio is yielded as MP3 chunks."""
+    inputs = (recorded_audio, uploaded_audio, text_input, image_filepath, language_choice, voice_service)
+    async for outputs in _consultation_async(inputs, stream_audio=True):
+        yield outputs
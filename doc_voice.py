@@ -1,11 +1,76 @@
 import os
-from gtts import gTTS
-import subprocess
-import platform
+import logging
+import itertools
+import tempfile
+import unicodedata
+from playback import play_audio
+from cache_store import TieredCache, make_key, ttl_from_env
+from metrics import span, register_gauge, cache_gauge
 
-def text_to_speech_with_gtts_old(input_text, output_filepath):
-    language="en"
+logger = logging.getLogger(__name__)
+
+# Imported on first use, see _gtts_save.
+gTTS = None
+
+# Synthesized speech shared by every TTS entry point, keyed on
+# (normalized text, language, engine, voice_id, model_id). Disk only.
+TTS_CACHE_ENABLED = os.environ.get("TTS_CACHE", "1") == "1"
+tts_cache = TieredCache(
+    "tts",
+    max_entries=0,
+    ttl=ttl_from_env("TTS_CACHE_TTL"),
+    directory=os.environ.get("TTS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ai_doctor_tts_cache"),
+    max_disk_bytes=int(os.environ.get("TTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    dumps=lambda data: data,
+    loads=lambda data: data
+)
+register_gauge("ai_doctor_tts_cache", cache_gauge(tts_cache))
+
+
+def normalize_tts_text(input_text):
+    return unicodedata.normalize("NFC", " ".join(input_text.split()))
+
+
+def cached_synthesis(input_text, output_filepath, synthesize, language, engine, voice_id=None, model_id=None):
+    """
+    Write speech for input_text to output_filepath, reusing a cached clip if one exists.
 
+    Args:
+        synthesize: Callable (input_text, output_filepath) doing the real synthesis.
+        language, engine, voice_id, model_id: Everything besides the text that
+            changes the audio, used as part of the cache key.
+
+    Returns:
+        True if the clip came from the cache.
+    """
+    with span("tts", engine=engine, language=language) as s:
+        if not TTS_CACHE_ENABLED:
+            synthesize(input_text, output_filepath)
+            if os.path.exists(output_filepath):
+                s.set(payload_bytes=os.path.getsize(output_filepath))
+            return False
+
+        key = make_key(normalize_tts_text(input_text), language, engine, voice_id, model_id)
+        data = tts_cache.get(key)
+        if data is not None:
+            with open(output_filepath, "wb") as f:
+                f.write(data)
+            s.set(outcome="cache_hit", payload_bytes=len(data))
+            return True
+
+        synthesize(input_text, output_filepath)
+        if os.path.exists(output_filepath):
+            with open(output_filepath, "rb") as f:
+                data = f.read()
+            tts_cache.set(key, data)
+            s.set(payload_bytes=len(data))
+        return False
+
+
+def _gtts_save(input_text, output_filepath, language):
+    global gTTS
+    if gTTS is None:
+        from gtts import gTTS
     audioobj= gTTS(
         text=input_text,
         lang=language,
@@ -14,129 +79,139 @@ def text_to_speech_with_gtts_old(input_text, output_filepath):
     audioobj.save(output_filepath)
 
 
+def synthesize_with_gtts(input_text, output_filepath, language="en"):
+    return cached_synthesis(
+        input_text, output_filepath,
+        lambda text, path: _gtts_save(text, path, language),
+        language=language, engine="gtts"
+    )
+
+
+def text_to_speech_with_gtts_old(input_text, output_filepath):
+    synthesize_with_gtts(input_text, output_filepath, language="en")
+
+
 def text_to_speech_with_gtts(input_text, output_filepath):
-    language="en"
+    synthesize_with_gtts(input_text, output_filepath, language="en")
+    play_audio(output_filepath)
 
-    audioobj= gTTS(
+
+
+ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
+ELEVENLABS_VOICE_ID = "JBFqnCBsd6RMkjVDRZzb"  # Using a specific voice ID
+ELEVENLABS_MODEL_ID = "eleven_turbo_v2_5"
+ELEVENLABS_OUTPUT_FORMAT = "mp3_44100_128"
+
+# Imported on first use so gTTS-only deployments never load the SDK.
+ElevenLabs = None
+
+
+class ElevenLabsUnavailable(RuntimeError):
+    """The SDK or the API key is missing; retrying will not help."""
+    retryable = False
+
+
+def _elevenlabs_client():
+    global ElevenLabs
+    if not ELEVENLABS_API_KEY:
+        raise ElevenLabsUnavailable("ElevenLabs API key not found in environment variables")
+    if ElevenLabs is None:
+        try:
+            from elevenlabs.client import ElevenLabs as client_class
+        except ImportError as e:
+            raise ElevenLabsUnavailable(f"ElevenLabs not available ({e}). Try: pip install elevenlabs --upgrade") from e
+        ElevenLabs = client_class
+    return ElevenLabs(api_key=ELEVENLABS_API_KEY)
+
+
+def _elevenlabs_save(input_text, output_filepath, voice_id, model_id):
+    client = _elevenlabs_client()
+    audio = client.text_to_speech.convert(
         text=input_text,
-        lang=language,
-        slow=False
+        voice_id=voice_id,
+        model_id=model_id,
+        output_format=ELEVENLABS_OUTPUT_FORMAT
     )
-    audioobj.save(output_filepath)
-    os_name = platform.system()
-    try:
-        if os_name == "Darwin":  # macOS
-            subprocess.run(['afplay', output_filepath])
-        elif os_name == "Windows":  
-            subprocess.run(['powershell', '-c', f'Add-Type -AssemblyName presentationCore; $mediaPlayer = New-Object system.windows.media.mediaplayer; $mediaPlayer.open([uri]::new((Resolve-Path "{output_filepath}").Path)); $mediaPlayer.Play(); Start-Sleep 5'])
-            
-        elif os_name == "Linux":  
-            players = ['mpg123', 'ffplay', 'aplay']
-            for player in players:
-                try:
-                    subprocess.run([player, output_filepath], check=True)
-                    break
-                except (subprocess.CalledProcessError, FileNotFoundError):
-                    continue
-            else:
-                raise OSError("No suitable audio player found")
-        else:
-            raise OSError("Unsupported operating system")
-    except Exception as e:
-        print(f"An error occurred while trying to play the audio: {e}")
-
-
-
-try:
-    from elevenlabs.client import ElevenLabs
-    ELEVENLABS_API_KEY = os.environ.get("ELEVENLABS_API_KEY")
-    
-    def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
-        if not ELEVENLABS_API_KEY:
-            print("ElevenLabs API key not found in environment variables")
-            return
-            
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-        audio = client.text_to_speech.convert(
-            text=input_text,
-            voice_id="JBFqnCBsd6RMkjVDRZzb",  # Using a specific voice ID
-            model_id="eleven_turbo_v2_5",
-            output_format="mp3_44100_128"
-        )
-        
-        # Save the audio to file
-        with open(output_filepath, "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
-        
-        os_name = platform.system()
-        try:
-            if os_name == "Darwin":  # macOS
-                subprocess.run(['afplay', output_filepath])
-            elif os_name == "Windows":  # Windows
-                # Use Windows Media Player for MP3 support
-                subprocess.run(['powershell', '-c', f'Add-Type -AssemblyName presentationCore; $mediaPlayer = New-Object system.windows.media.mediaplayer; $mediaPlayer.open([uri]::new((Resolve-Path "{output_filepath}").Path)); $mediaPlayer.Play(); Start-Sleep 5'])
-            elif os_name == "Linux":  # Linux
-                players = ['mpg123', 'ffplay', 'aplay']
-                for player in players:
-                    try:
-                        subprocess.run([player, output_filepath], check=True)
-                        break
-                    except (subprocess.CalledProcessError, FileNotFoundError):
-                        continue
-                else:
-                    raise OSError("No suitable audio player found")
-            else:
-                raise OSError("Unsupported operating system")
-        except Exception as e:
-            print(f"An error occurred while trying to play the audio: {e}")
-
-    def text_to_speech_with_elevenlabs(input_text, output_filepath):
-        if not ELEVENLABS_API_KEY:
-            print("ElevenLabs API key not found in environment variables")
+
+    with open(output_filepath, "wb") as f:
+        for chunk in audio:
+            f.write(chunk)
+
+
+def synthesize_with_elevenlabs(input_text, output_filepath, voice_id=ELEVENLABS_VOICE_ID, model_id=ELEVENLABS_MODEL_ID):
+    # Cache hits do not touch the ElevenLabs quota.
+    return cached_synthesis(
+        input_text, output_filepath,
+        lambda text, path: _elevenlabs_save(text, path, voice_id, model_id),
+        language="auto", engine="elevenlabs/" + ELEVENLABS_OUTPUT_FORMAT,
+        voice_id=voice_id, model_id=model_id
+    )
+
+
+def stream_with_elevenlabs(input_text, output_filepath, voice_id=ELEVENLABS_VOICE_ID, model_id=ELEVENLABS_MODEL_ID):
+    """
+    Yield MP3 chunks from the ElevenLabs streaming API as they arrive, writing
+    them to output_filepath on the side. The file only appears once the whole
+    clip has been received. Clips already in tts_cache are replayed from there.
+    """
+    engine = "elevenlabs/" + ELEVENLABS_OUTPUT_FORMAT
+    key = make_key(normalize_tts_text(input_text), "auto", engine, voice_id, model_id)
+    with span("tts", engine=engine, language="auto", mode="stream") as s:
+        data = tts_cache.get(key) if TTS_CACHE_ENABLED else None
+        if data is not None:
+            with open(output_filepath, "wb") as f:
+                f.write(data)
+            s.set(outcome="cache_hit", payload_bytes=len(data))
+            yield data
             return
-            
-        client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
-        audio = client.text_to_speech.convert(
-            text=input_text,
-            voice_id="JBFqnCBsd6RMkjVDRZzb",  # Using a specific voice ID
-            model_id="eleven_turbo_v2_5",
-            output_format="mp3_44100_128"
-        )
-        
-        
-        with open(output_filepath, "wb") as f:
-            for chunk in audio:
-                f.write(chunk)
-        
-        os_name = platform.system()
+
+        part_path = output_filepath + ".part"
+        received = []
         try:
-            if os_name == "Darwin": 
-                subprocess.run(['afplay', output_filepath])
-            elif os_name == "Windows":  
-                subprocess.run(['powershell', '-c', f'Add-Type -AssemblyName presentationCore; $mediaPlayer = New-Object system.windows.media.mediaplayer; $mediaPlayer.open([uri]::new((Resolve-Path "{output_filepath}").Path)); $mediaPlayer.Play(); Start-Sleep 5'])
-            elif os_name == "Linux":  # Linux
-                players = ['mpg123', 'ffplay', 'aplay']
-                for player in players:
-                    try:
-                        subprocess.run([player, output_filepath], check=True)
-                        break
-                    except (subprocess.CalledProcessError, FileNotFoundError):
+            with span("tts_first_chunk", engine=engine):
+                client = _elevenlabs_client()
+                chunks = iter(client.text_to_speech.stream(
+                    text=input_text,
+                    voice_id=voice_id,
+                    model_id=model_id,
+                    output_format=ELEVENLABS_OUTPUT_FORMAT
+                ))
+                first_chunk = next(chunks, b"")
+
+            with open(part_path, "wb") as f:
+                for chunk in itertools.chain([first_chunk], chunks):
+                    if not chunk:
                         continue
-                else:
-                    raise OSError("No suitable audio player found")
-            else:
-                raise OSError("Unsupported operating system")
-        except Exception as e:
-            print(f"An error occurred while trying to play the audio: {e}")
-
-except ImportError as e:
-    print(f"ElevenLabs library import error: {e}")
-    print("Try: pip install elevenlabs --upgrade")
-    def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
-        print("ElevenLabs not available")
-    def text_to_speech_with_elevenlabs(input_text, output_filepath):
-        print("ElevenLabs not available")
+                    f.write(chunk)
+                    received.append(chunk)
+                    yield chunk
+            os.replace(part_path, output_filepath)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        data = b"".join(received)
+        s.set(payload_bytes=len(data))
+        if TTS_CACHE_ENABLED and data:
+            tts_cache.set(key, data)
+
+
+def text_to_speech_with_elevenlabs_old(input_text, output_filepath):
+    text_to_speech_with_elevenlabs(input_text, output_filepath)
+
+
+def text_to_speech_with_elevenlabs(input_text, output_filepath):
+    if not ELEVENLABS_API_KEY:
+        logger.warning("ElevenLabs API key not found in environment variables")
+        return
+
+    try:
+        synthesize_with_elevenlabs(input_text, output_filepath)
+    except RuntimeError as e:
+        logger.warning(str(e))
+        return
+
+    play_audio(output_filepath)
 
 
 
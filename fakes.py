@@ -0,0 +1,228 @@
+"""
+Local stand-ins for Groq, gTTS and ElevenLabs.
+
+They mimic the parts of each client the app uses, sleep for a configurable
+latency and return payloads of a configurable size, so the pipeline can be
+benchmarked and load-tested without API keys or network access.
+
+    import fakes
+    with fakes.installed(fakes.FakeConfig(groq_latency=0.8)):
+        process_inputs(...)
+"""
+import time
+import random
+import asyncio
+import contextlib
+from types import SimpleNamespace
+from dataclasses import dataclass
+
+# A silent MPEG-1 Layer III frame header followed by padding; enough for players
+# and byte-level MP3 concatenation, which is all the app does with TTS output.
+_MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+_SENTENCES = [
+    "With what I see, I think you have a mild skin inflammation that should settle with gentle care.",
+    "Keep the area clean, avoid picking at it and use a non comedogenic moisturiser twice a day.",
+    "If it spreads or becomes painful please see a dermatologist in person.",
+]
+
+
+@dataclass
+class FakeConfig:
+    """
+    Behaviour of the stand-ins. Latencies are in seconds, jitter is the
+    +/- fraction applied to each latency.
+    """
+    groq_latency: float = 0.5
+    stt_latency: float = 0.3
+    gtts_latency: float = 0.4
+    elevenlabs_latency: float = 0.6
+    jitter: float = 0.2
+    response_chars: int = 250
+    transcript_text: str = "I have a red itchy rash on my cheek since last week"
+    audio_bytes_per_char: int = 200
+    stream_chunk_chars: int = 8
+    failure_rate: float = 0.0
+
+
+def _sleep_for(config, latency):
+    if latency > 0:
+        time.sleep(latency * random.uniform(1 - config.jitter, 1 + config.jitter))
+
+
+def _maybe_fail(config, provider):
+    if config.failure_rate and random.random() < config.failure_rate:
+        raise RuntimeError(f"fake {provider} failure")
+
+
+def _response_text(config):
+    text = " ".join(_SENTENCES)
+    while len(text) < config.response_chars:
+        text += " " + text
+    return text[:config.response_chars].rsplit(" ", 1)[0] + "."
+
+
+def _mp3_bytes(config, text):
+    size = max(len(_MP3_FRAME), len(text) * config.audio_bytes_per_char)
+    return (_MP3_FRAME * (size // len(_MP3_FRAME) + 1))[:size]
+
+
+class _FakeCompletions:
+    def __init__(self, config):
+        self.config = config
+
+    def create(self, messages, model, stream=False, **kwargs):
+        _maybe_fail(self.config, "groq")
+        text = _response_text(self.config)
+        if not stream:
+            _sleep_for(self.config, self.config.groq_latency)
+            message = SimpleNamespace(content=text, role="assistant")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=model)
+        return self._stream(text)
+
+    def _stream(self, text):
+        size = self.config.stream_chunk_chars
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        # Time to first token is a third of the latency, the rest is spread over the tokens.
+        _sleep_for(self.config, self.config.groq_latency / 3)
+        per_piece = self.config.groq_latency * 2 / 3 / max(1, len(pieces))
+        for piece in pieces:
+            time.sleep(per_piece)
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class _FakeTranscriptions:
+    def __init__(self, config):
+        self.config = config
+
+    def create(self, model, file, language=None, **kwargs):
+        _maybe_fail(self.config, "groq-stt")
+        if hasattr(file, "read"):
+            file.read()
+        _sleep_for(self.config, self.config.stt_latency)
+        return SimpleNamespace(text=self.config.transcript_text)
+
+
+class FakeGroq:
+    """Drop-in for groq.Groq covering chat completions, transcriptions and models.list."""
+
+    def __init__(self, config=None, **kwargs):
+        self.config = config or FakeConfig()
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self.config))
+        self.audio = SimpleNamespace(transcriptions=_FakeTranscriptions(self.config))
+        self.models = SimpleNamespace(list=lambda: [])
+
+    def close(self):
+        pass
+
+
+class _FakeAsyncCompletions:
+    def __init__(self, config):
+        self.config = config
+
+    async def create(self, messages, model, **kwargs):
+        _maybe_fail(self.config, "groq")
+        latency = self.config.groq_latency
+        await asyncio.sleep(latency * random.uniform(1 - self.config.jitter, 1 + self.config.jitter))
+        message = SimpleNamespace(content=_response_text(self.config), role="assistant")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], model=model)
+
+
+class FakeAsyncGroq:
+    """Drop-in for groq.AsyncGroq chat completions."""
+
+    def __init__(self, config=None, **kwargs):
+        self.config = config or FakeConfig()
+        self.chat = SimpleNamespace(completions=_FakeAsyncCompletions(self.config))
+
+    async def close(self):
+        pass
+
+
+def fake_gtts_class(config):
+    """Build a gTTS replacement class bound to config."""
+
+    class FakeGTTS:
+        def __init__(self, text, lang="en", slow=False, **kwargs):
+            self.text = text
+            self.lang = lang
+
+        def save(self, savefile):
+            _maybe_fail(config, "gtts")
+            _sleep_for(config, config.gtts_latency)
+            with open(savefile, "wb") as f:
+                f.write(_mp3_bytes(config, self.text))
+
+        def stream(self):
+            _maybe_fail(config, "gtts")
+            _sleep_for(config, config.gtts_latency)
+            yield _mp3_bytes(config, self.text)
+
+    return FakeGTTS
+
+
+class _FakeTextToSpeech:
+    def __init__(self, config):
+        self.config = config
+
+    def convert(self, text, voice_id, model_id=None, output_format=None, **kwargs):
+        _maybe_fail(self.config, "elevenlabs")
+        return self._chunks(text)
+
+    stream = convert
+
+    def _chunks(self, text):
+        data = _mp3_bytes(self.config, text)
+        chunk_size = 4096
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        # First chunk arrives after a third of the latency, the rest are spread evenly.
+        _sleep_for(self.config, self.config.elevenlabs_latency / 3)
+        per_chunk = self.config.elevenlabs_latency * 2 / 3 / max(1, len(chunks))
+        for chunk in chunks:
+            yield chunk
+            time.sleep(per_chunk)
+
+
+class FakeElevenLabs:
+    """Drop-in for elevenlabs.client.ElevenLabs text_to_speech.convert/stream."""
+
+    def __init__(self, config=None, api_key=None, **kwargs):
+        self.config = config or FakeConfig()
+        self.text_to_speech = _FakeTextToSpeech(self.config)
+
+
+@contextlib.contextmanager
+def installed(config=None):
+    """
+    Swap the stand-ins into groq_pool and doc_voice for the duration of the block.
+
+    Pooled clients are dropped on entry and exit, so real and fake clients never mix.
+    """
+    import groq_pool
+    import doc_voice
+
+    config = config or FakeConfig()
+    saved = {
+        "make_client": groq_pool._make_client,
+        "make_async_client": groq_pool._make_async_client,
+        "gTTS": doc_voice.gTTS,
+        "ElevenLabs": doc_voice.ElevenLabs,
+        "ELEVENLABS_API_KEY": doc_voice.ELEVENLABS_API_KEY,
+    }
+
+    groq_pool.close_all()
+    groq_pool._make_client = lambda api_key: FakeGroq(config)
+    groq_pool._make_async_client = lambda api_key: FakeAsyncGroq(config)
+    doc_voice.gTTS = fake_gtts_class(config)
+    doc_voice.ElevenLabs = lambda api_key=None, **kwargs: FakeElevenLabs(config)
+    doc_voice.ELEVENLABS_API_KEY = "fake-key"
+    try:
+        yield config
+    finally:
+        groq_pool.close_all()
+        groq_pool._make_client = saved["make_client"]
+        groq_pool._make_async_client = saved["make_async_client"]
+        doc_voice.gTTS = saved["gTTS"]
+        doc_voice.ElevenLabs = saved["ElevenLabs"]
+        doc_voice.ELEVENLABS_API_KEY = saved["ELEVENLABS_API_KEY"]
@@ -0,0 +1,129 @@
+import os
+import asyncio
+import logging
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
+
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+
+# Connection pool settings shared by every Groq client in the process.
+MAX_CONNECTIONS = int(os.environ.get("GROQ_MAX_CONNECTIONS", "50"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GROQ_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.environ.get("GROQ_KEEPALIVE_EXPIRY", "60"))
+REQUEST_TIMEOUT = float(os.environ.get("GROQ_TIMEOUT", "60"))
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def _make_client(api_key):
+    # groq and httpx are imported here so importing this module stays cheap.
+    import httpx
+    from groq import Groq
+
+    http_client = httpx.Client(limits=_limits(), timeout=REQUEST_TIMEOUT)
+    return Groq(api_key=api_key, http_client=http_client)
+
+
+def _make_async_client(api_key):
+    import httpx
+    from groq import AsyncGroq
+
+    http_client = httpx.AsyncClient(limits=_limits(), timeout=REQUEST_TIMEOUT)
+    return AsyncGroq(api_key=api_key, http_client=http_client)
+
+
+def get_groq_client(api_key=None):
+    """
+    Return the process-wide Groq client for an API key, creating it on first use.
+
+    The client keeps its HTTP connections alive, so only the first call pays for
+    the TLS handshake. The client is thread-safe and can be shared by workers.
+
+    Args:
+        api_key: Groq API key. Defaults to the GROQ_API_KEY environment variable.
+    """
+    api_key = api_key or os.environ.get("GROQ_API_KEY")
+    client = _clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = _make_client(api_key)
+                _clients[api_key] = client
+    return client
+
+
+def get_async_groq_client(api_key=None):
+    """
+    Return the pooled AsyncGroq client for an API key and the running event loop.
+
+    httpx async connections are bound to the loop that opened them, so one
+    client is kept per (api key, event loop) pair.
+
+    Args:
+        api_key: Groq API key. Defaults to the GROQ_API_KEY environment variable.
+    """
+    api_key = api_key or os.environ.get("GROQ_API_KEY")
+    loop = asyncio.get_running_loop()
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(api_key)
+        if client is None:
+            client = _make_async_client(api_key)
+            loop_clients[api_key] = client
+    return client
+
+
+def warm_up(api_key=None):
+    """
+    Create the pooled client and open a keep-alive connection to the Groq API.
+
+    Meant to be called once at app start so the first user request does not pay
+    for connection setup. Failures are reported and otherwise ignored.
+    """
+    client = get_groq_client(api_key)
+    try:
+        client.models.list()
+        return True
+    except Exception as e:
+        logger.warning(f"Groq warm-up failed: {e}")
+        return False
+
+
+def close_all():
+    """
+    Close every pooled client. Mostly useful in tests and on shutdown.
+
+    Async clients are closed on their own event loop: scheduled there if it is
+    running, run to completion if it is stopped. Clients of a loop that is
+    already closed are only dropped, their connections went with the loop.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        async_clients = [(loop, list(loop_clients.values())) for loop, loop_clients in _async_clients.items()]
+        _clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        client.close()
+    for loop, loop_clients in async_clients:
+        for client in loop_clients:
+            if loop.is_closed():
+                continue
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.close(), loop)
+            else:
+                loop.run_until_complete(client.close())
@@ -0,0 +1,118 @@
+import os
+import logging
+import mimetypes
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+# Longest edge (in pixels) of the image sent to the vision model.
+MAX_EDGE = int(os.environ.get("IMAGE_MAX_EDGE", "1536"))
+# JPEG quality used when the image has to be re-encoded.
+JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+# Files already this small (and within MAX_EDGE) are sent unchanged.
+PASSTHROUGH_BYTES = int(os.environ.get("IMAGE_PASSTHROUGH_BYTES", str(512 * 1024)))
+# Refuse to decode anything larger than this many pixels (decompression bombs).
+MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(120_000_000)))
+
+# Formats the vision API accepts as-is.
+SUPPORTED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif"}
+
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+_EXIF_ORIENTATION = 0x0112
+
+
+def detect_mime_type(image_path):
+    """
+    Detect the MIME type of an image from its first bytes, falling back to the
+    file extension and finally to image/jpeg.
+    """
+    with open(image_path, "rb") as f:
+        header = f.read(16)
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if header.startswith(magic):
+            return mime_type
+    guessed, _ = mimetypes.guess_type(image_path)
+    return guessed or "image/jpeg"
+
+
+def _read_raw(image_path):
+    with open(image_path, "rb") as f:
+        return f.read(), detect_mime_type(image_path)
+
+
+try:
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+
+    def preprocess_image(image_path, max_edge=None, quality=None):
+        """
+        Prepare an uploaded image for the vision model.
+
+        Small, upright images in a supported format are passed through untouched.
+        Everything else is decoded at reduced scale where the codec allows it
+        (JPEG DCT scaling keeps memory bounded for phone/DSLR photos), rotated
+        according to its EXIF orientation, downscaled so its longest edge is at
+        most max_edge and re-encoded as JPEG.
+
+        Args:
+            image_path: Path to the uploaded image.
+            max_edge: Longest edge in pixels. Defaults to IMAGE_MAX_EDGE.
+            quality: JPEG quality used for re-encoding. Defaults to IMAGE_JPEG_QUALITY.
+
+        Returns:
+            (image_bytes, mime_type)
+        """
+        max_edge = max_edge or MAX_EDGE
+        quality = quality or JPEG_QUALITY
+
+        try:
+            with Image.open(image_path) as img:
+                mime_type = Image.MIME.get(img.format, detect_mime_type(image_path))
+                orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+                file_size = os.path.getsize(image_path)
+
+                if (mime_type in SUPPORTED_MIME_TYPES
+                        and max(img.size) <= max_edge
+                        and orientation == 1
+                        and file_size <= PASSTHROUGH_BYTES):
+                    return _read_raw(image_path)
+
+                # Let the JPEG decoder skip straight to the smallest DCT scale
+                # whose longest edge is still >= max_edge.
+                scale = min(1.0, max_edge / max(img.size))
+                img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+
+                if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel("A"))
+                    img = background
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+
+                buffer = BytesIO()
+                img.save(buffer, format="JPEG", quality=quality, optimize=True)
+                return buffer.getvalue(), "image/jpeg"
+        except Image.DecompressionBombError:
+            raise
+        except Exception as e:
+            logger.warning(f"Image preprocessing failed, sending original file: {e}")
+            return _read_raw(image_path)
+
+except ImportError as e:
+    logger.warning(f"Pillow import error: {e}. Images will be sent without preprocessing. Try: pip install pillow")
+
+    def preprocess_image(image_path, max_edge=None, quality=None):
+        return _read_raw(image_path)
@@ -0,0 +1,451 @@
+"""
+Load-test the Gradio app with many simultaneous users.
+
+Launches gradio_app.iface in this process against the provider stand-ins in
+fakes.py (or targets an app that is already running with --url) and drives it
+through the Gradio client API. Every virtual user submits consultations to
+/consultation in a loop: a mix of text, audio and image requests across
+English, Hindi and Marathi. Each --users level runs for --duration seconds and
+the report gives, per level:
+
+  * latency percentiles of each output (transcript, doctor's text, audio) and
+    of the whole request, overall and per request kind,
+  * Gradio queue depth, sampled every --sample-interval seconds,
+  * process RSS (which includes the client threads when the app runs here)
+    and growth of the artifact workspace and Gradio's file cache,
+  * error rate per request kind, with a sample of the error messages.
+
+    python loadtest.py --users 50 --users 200 --users 500 --duration 60 --output load.json
+
+The stand-in latencies take the same flags as benchmark.py. Caches are
+disabled and every question is unique, so each request does the full work.
+With --url only the client-side figures and queue depth are measured.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import threading
+import collections
+from datetime import datetime, timezone
+
+from benchmark import SAMPLE_IMAGE, percentile, write_test_wav, git_commit
+
+LANGUAGES = ["English", "Hindi", "Marathi"]
+VOICES = {"gtts": "gTTS (Free)", "elevenlabs": "ElevenLabs (Premium)"}
+KINDS = ["text", "audio", "image"]
+OUTPUTS = ["transcript", "response", "audio"]
+
+QUESTIONS = {
+    "English": "I have had a dry cough and mild fever for {n} days",
+    "Hindi": "मुझे {n} दिनों से सूखी खांसी और हल्का बुखार है",
+    "Marathi": "मला {n} दिवसांपासून कोरडा खोकला आणि ताप आहे",
+}
+IMAGE_QUESTIONS = {
+    "English": "Is this rash serious? ({n})",
+    "Hindi": "क्या यह दाने गंभीर हैं? ({n})",
+    "Marathi": "हे पुरळ गंभीर आहे का? ({n})",
+}
+
+
+def parse_mix(text):
+    """"text=2,audio=1,image=1" -> {"text": 2.0, "audio": 1.0, "image": 1.0}"""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in KINDS:
+            raise argparse.ArgumentTypeError(f"unknown request kind {kind!r}, expected one of {KINDS}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def dir_usage(path):
+    """(file count, total bytes) under path."""
+    count = 0
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+                count += 1
+            except OSError:
+                pass
+    return count, total
+
+
+def user_audio(workdir, template, user):
+    """A copy of the template WAV with one sample changed, so users' recordings hash differently."""
+    path = os.path.join(workdir, "users", f"question_{user}.wav")
+    if not os.path.exists(path):
+        with open(template, "rb") as f:
+            data = bytearray(f.read())
+        data[-2:] = (user % 65536).to_bytes(2, "little")
+        with open(path, "wb") as f:
+            f.write(data)
+    return path
+
+
+def request_args(kind, language, voice, user, i, audio_path):
+    """Inputs of /consultation: recorded audio, uploaded audio, text, image, language, voice."""
+    from gradio_client import handle_file
+
+    n = user * 1000 + i
+    if kind == "audio":
+        return None, handle_file(audio_path), "", None, language, voice
+    if kind == "image":
+        return None, None, IMAGE_QUESTIONS[language].format(n=n), handle_file(SAMPLE_IMAGE), language, voice
+    return None, None, QUESTIONS[language].format(n=n), None, language, voice
+
+
+def run_request(client, kind, language, args):
+    """Submit one consultation and time when each output first arrives."""
+    sample = {"kind": kind, "language": language, "error": None}
+    start = time.perf_counter()
+    try:
+        job = client.submit(*args, api_name="/consultation")
+        outputs = None
+        for outputs in job:
+            elapsed = time.perf_counter() - start
+            for name, value in zip(OUTPUTS, outputs):
+                if value and name not in sample:
+                    sample[name] = elapsed
+        outputs = job.result() if outputs is None else outputs
+        response = outputs[1] if outputs else None
+        if isinstance(response, str) and response.startswith("Error processing:"):
+            sample["error"] = response
+        elif not outputs or not outputs[2]:
+            sample["error"] = "no audio in reply"
+    except Exception as e:
+        sample["error"] = f"{type(e).__name__}: {e}"
+    sample["total"] = time.perf_counter() - start
+    return sample
+
+
+class Monitor:
+    """Samples queue depth, RSS and artifact usage in a background thread."""
+
+    def __init__(self, url, interval, artifact_dirs):
+        self.url = url.rstrip("/")
+        self.interval = interval
+        self.artifact_dirs = artifact_dirs
+        self.samples = []
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self):
+        import httpx
+
+        sample = {"time": time.time(), "rss_bytes": rss_bytes(), "in_flight": self.in_flight, "queue_size": None}
+        try:
+            response = httpx.get(f"{self.url}/gradio_api/queue/status", timeout=5)
+            sample["queue_size"] = response.json().get("queue_size")
+        except Exception:
+            pass
+        for name, path in self.artifact_dirs.items():
+            sample[f"{name}_files"], sample[f"{name}_bytes"] = dir_usage(path)
+        return sample
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.samples.append(self.snapshot())
+
+    def start(self):
+        self.samples = [self.snapshot()]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append(self.snapshot())
+        return self.samples
+
+    def track(self, delta):
+        with self._lock:
+            self.in_flight += delta
+
+
+def latency_stats(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p90_ms": percentile(values, 90) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+
+def summarize_requests(requests):
+    errors = [r for r in requests if r["error"]]
+    ok = [r for r in requests if not r["error"]]
+    return {
+        "requests": len(requests),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(requests) if requests else 0.0,
+        "latency": {name: latency_stats([r[name] for r in ok if name in r]) for name in OUTPUTS + ["total"]},
+    }
+
+
+def summarize_level(users, wall_seconds, requests, samples, artifact_dirs):
+    summary = summarize_requests(requests)
+    summary.update({
+        "users": users,
+        "wall_seconds": wall_seconds,
+        "throughput_per_s": (summary["requests"] - summary["errors"]) / wall_seconds if wall_seconds else 0.0,
+        "by_kind": {kind: summarize_requests([r for r in requests if r["kind"] == kind])
+                    for kind in KINDS if any(r["kind"] == kind for r in requests)},
+        "error_messages": dict(collections.Counter(r["error"][:200] for r in requests if r["error"]).most_common(5)),
+    })
+
+    depths = [s["queue_size"] for s in samples if s["queue_size"] is not None]
+    summary["queue"] = {
+        "max": max(depths) if depths else None,
+        "mean": sum(depths) / len(depths) if depths else None,
+        "p95": percentile(depths, 95) if depths else None,
+        "max_in_flight": max(s["in_flight"] for s in samples),
+    }
+
+    first, last = samples[0], samples[-1]
+    rss = [s["rss_bytes"] for s in samples if s["rss_bytes"] is not None]
+    summary["memory"] = {
+        "rss_start_mb": first["rss_bytes"] / 2**20 if first["rss_bytes"] else None,
+        "rss_peak_mb": max(rss) / 2**20 if rss else None,
+        "rss_end_mb": last["rss_bytes"] / 2**20 if last["rss_bytes"] else None,
+    }
+    summary["artifacts"] = {
+        name: {
+            "files_start": first[f"{name}_files"],
+            "files_end": last[f"{name}_files"],
+            "growth_mb": (last[f"{name}_bytes"] - first[f"{name}_bytes"]) / 2**20,
+            "growth_kb_per_request": (last[f"{name}_bytes"] - first[f"{name}_bytes"]) / 1024 / len(requests) if requests else 0.0,
+        }
+        for name in artifact_dirs
+    }
+    summary["timeline"] = samples
+    return summary
+
+
+def run_level(url, users, args, mix, workdir, audio_template, monitor):
+    """Run `users` virtual users for args.duration seconds and return their request samples."""
+    from gradio_client import Client
+
+    requests = []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + args.ramp + args.duration
+
+    def user_loop(user):
+        rng = random.Random(args.seed * 100003 + user)
+        time.sleep(args.ramp * user / users)
+        try:
+            client = Client(url, verbose=False, download_files=False, analytics_enabled=False)
+        except Exception as e:
+            with lock:
+                requests.append({"kind": "connect", "language": None, "error": f"{type(e).__name__}: {e}", "total": 0.0})
+            return
+        audio_path = user_audio(workdir, audio_template, user)
+        i = 0
+        while time.perf_counter() < deadline:
+            kind = rng.choices(list(mix), weights=list(mix.values()))[0]
+            language = LANGUAGES[(user + i) % len(LANGUAGES)]
+            voice = VOICES["elevenlabs"] if rng.random() < args.elevenlabs_share else VOICES["gtts"]
+            monitor.track(1)
+            try:
+                sample = run_request(client, kind, language, request_args(kind, language, voice, user, i, audio_path))
+            finally:
+                monitor.track(-1)
+            with lock:
+                requests.append(sample)
+            i += 1
+            if args.think_time:
+                time.sleep(rng.expovariate(1 / args.think_time))
+
+    threads = [threading.Thread(target=user_loop, args=(user,), daemon=True) for user in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return requests, time.perf_counter() - start
+
+
+def launch_app(workdir, port):
+    """Start gradio_app.iface in this process with its static audio built; returns its URL."""
+    import consultation
+    from gradio_app import iface
+    from static_audio import static_audio
+    from workspace import workspace
+
+    consultation.build_static_audio()
+    iface.launch(
+        server_name="127.0.0.1",
+        server_port=port,
+        prevent_thread_lock=True,
+        quiet=True,
+        allowed_paths=[workspace.root, static_audio.root],
+    )
+    return iface.local_url
+
+
+def print_level(summary):
+    print(f"\n== {summary['users']} users: {summary['requests']} requests in {summary['wall_seconds']:.1f}s, "
+          f"{summary['throughput_per_s']:.2f}/s, errors {summary['errors']} ({summary['error_rate']:.1%})")
+    queue, memory = summary["queue"], summary["memory"]
+    if queue["max"] is not None:
+        print(f"   queue depth max={queue['max']} p95={queue['p95']:.1f} mean={queue['mean']:.1f}", end="")
+    print(f"  in flight max={queue['max_in_flight']}")
+    if memory["rss_start_mb"] is not None:
+        print(f"   rss start={memory['rss_start_mb']:.0f}MiB peak={memory['rss_peak_mb']:.0f}MiB end={memory['rss_end_mb']:.0f}MiB")
+    for name, artifacts in summary["artifacts"].items():
+        print(f"   {name}: {artifacts['files_start']} -> {artifacts['files_end']} files, "
+              f"+{artifacts['growth_mb']:.1f}MiB ({artifacts['growth_kb_per_request']:.1f}KiB/request)")
+    print(f"   {'kind':8} {'output':10} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  err")
+    rows = [("all", summary)] + list(summary["by_kind"].items())
+    for kind, stats in rows:
+        for name in OUTPUTS + ["total"]:
+            latency = stats["latency"][name]
+            if not latency["count"]:
+                continue
+            print(f"   {kind:8} {name:10} {latency['count']:6d} {latency['p50_ms']:8.0f}ms {latency['p95_ms']:8.0f}ms "
+                  f"{latency['p99_ms']:8.0f}ms {latency['max_ms']:8.0f}ms  {stats['error_rate']:.1%}")
+    for message, count in summary["error_messages"].items():
+        print(f"   error x{count}: {message}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, action="append", help="Simultaneous users; repeat to run several levels (default 50)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds each level runs after ramp-up")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds over which users start")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between a user's requests (s)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("text=2,audio=1,image=1"),
+                        help="Request kinds and weights, e.g. text=2,audio=1,image=1")
+    parser.add_argument("--elevenlabs-share", type=float, default=0.2, help="Fraction of requests asking for ElevenLabs")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="Test an app that is already running instead of launching one")
+    parser.add_argument("--port", type=int, help="Port for the launched app (default: first free from 7860)")
+    parser.add_argument("--groq-latency", type=float, default=0.5)
+    parser.add_argument("--stt-latency", type=float, default=0.3)
+    parser.add_argument("--gtts-latency", type=float, default=0.4)
+    parser.add_argument("--elevenlabs-latency", type=float, default=0.6)
+    parser.add_argument("--response-chars", type=int, default=250)
+    parser.add_argument("--audio-bytes-per-char", type=int, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of stand-in provider calls that fail")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    args = parser.parse_args(argv)
+    levels = args.users or [50]
+
+    workdir = tempfile.mkdtemp(prefix="ai_doctor_load_")
+    os.makedirs(os.path.join(workdir, "users"))
+    audio_template = os.path.join(workdir, "question.wav")
+    write_test_wav(audio_template, seconds=3)
+
+    config = None
+    artifact_dirs = {}
+    if args.url:
+        url = args.url
+    else:
+        # Configure before the app modules are imported, as benchmark.py does,
+        # and keep Gradio's uploads and output copies in the work directory.
+        os.environ.update({
+            "TTS_CACHE": "0",
+            "STT_CACHE": "0",
+            "GROQ_RATE_LIMIT": "0",
+            "RESPONSE_CACHE_SIZE": "0",
+            "AUDIO_PLAYBACK": "none",
+            "GROQ_WARMUP": "0",
+            "GROQ_API_KEY": os.environ.get("GROQ_API_KEY") or "fake-key",
+            "ELEVENLABS_API_KEY": os.environ.get("ELEVENLABS_API_KEY") or "fake-key",
+            "GRADIO_ANALYTICS_ENABLED": "False",
+            "GRADIO_TEMP_DIR": os.path.join(workdir, "gradio"),
+            "AI_DOCTOR_WORKSPACE": os.path.join(workdir, "artifacts"),
+            "STATIC_AUDIO_DIR": os.path.join(workdir, "static_audio"),
+        })
+        artifact_dirs = {"workspace": os.environ["AI_DOCTOR_WORKSPACE"], "gradio_cache": os.environ["GRADIO_TEMP_DIR"]}
+        for path in artifact_dirs.values():
+            os.makedirs(path, exist_ok=True)
+
+        import fakes
+
+        config = fakes.FakeConfig(
+            groq_latency=args.groq_latency,
+            stt_latency=args.stt_latency,
+            gtts_latency=args.gtts_latency,
+            elevenlabs_latency=args.elevenlabs_latency,
+            response_chars=args.response_chars,
+            audio_bytes_per_char=args.audio_bytes_per_char,
+            failure_rate=args.failure_rate,
+        )
+
+    results = []
+    with fakes.installed(config) if config else contextlib.nullcontext():
+        if not args.url:
+            url = launch_app(workdir, args.port)
+            print(f"App running at {url} (work directory {workdir})")
+        monitor = Monitor(url, args.sample_interval, artifact_dirs)
+        for users in levels:
+            monitor.start()
+            requests, wall_seconds = run_level(url, users, args, args.mix, workdir, audio_template, monitor)
+            summary = summarize_level(users, wall_seconds, requests, monitor.stop(), artifact_dirs)
+            if not args.url:
+                import resilience
+                from consultation import consultations
+                summary["providers"] = resilience.stats()
+                summary["single_flight"] = consultations.stats()
+            print_level(summary)
+            results.append(summary)
+
+        if not args.url:
+            from gradio_app import iface
+            iface.close()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "url": args.url,
+            "duration": args.duration,
+            "ramp": args.ramp,
+            "think_time": args.think_time,
+            "mix": args.mix,
+            "elevenlabs_share": args.elevenlabs_share,
+            "fake_config": vars(config) if config else None,
+            "server_env": {name: os.environ.get(name) for name in (
+                "QUEUE_CONCURRENCY", "ASYNC_QUEUE_CONCURRENCY", "QUEUE_MAX_SIZE", "AI_DOCTOR_ASYNC", "SINGLE_FLIGHT")},
+        },
+        "levels": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if not args.url:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import json
+import time
+import logging
+import threading
+import contextlib
+
+logger = logging.getLogger("ai_doctor.metrics")
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_histograms = {}   # (stage, labels) -> [bucket counts..., +Inf count, sum]
+_payload_bytes = {}  # (stage, labels) -> total bytes
+_gauge_sources = {}  # metric name -> callable returning {labels tuple: value}
+
+
+class Span:
+    """Handle yielded by span(); lets the stage attach its outcome and payload size."""
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = dict(labels)
+        self.outcome = "ok"
+        self.payload_bytes = None
+        self.duration = None
+
+    def set(self, outcome=None, payload_bytes=None, **labels):
+        if outcome is not None:
+            self.outcome = outcome
+        if payload_bytes is not None:
+            self.payload_bytes = payload_bytes
+        self.labels.update(labels)
+
+
+@contextlib.contextmanager
+def span(stage, **labels):
+    """
+    Time a pipeline stage and record it.
+
+    The outcome label is "ok" unless the block raises (then "error") or sets
+    another one, e.g. span.set(outcome="cache_hit"). Every span is counted in a
+    latency histogram, its payload size is summed, and one JSON line is logged.
+
+        with span("vision", model=model) as s:
+            s.set(payload_bytes=len(encoded_image))
+            ...
+    """
+    s = Span(stage, labels)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield s
+    except GeneratorExit:
+        # A streaming consumer stopped early; not a provider failure.
+        s.outcome = "cancelled"
+        raise
+    except BaseException as e:
+        s.outcome = "error"
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration = time.perf_counter() - start
+        _record(s)
+        record = {"stage": stage, "outcome": s.outcome, "duration_ms": round(s.duration * 1000, 2)}
+        if s.payload_bytes is not None:
+            record["payload_bytes"] = s.payload_bytes
+        record.update(s.labels)
+        if error:
+            record["error"] = error
+        logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+
+def _key(s):
+    labels = dict(s.labels, stage=s.stage, outcome=s.outcome)
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _record(s):
+    key = _key(s)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if s.duration <= bound:
+                histogram[index] += 1
+        histogram[len(LATENCY_BUCKETS)] += 1
+        histogram[-1] += s.duration
+        if s.payload_bytes is not None:
+            _payload_bytes[key] = _payload_bytes.get(key, 0) + s.payload_bytes
+
+
+def register_gauge(name, source):
+    """
+    Expose extra values on the metrics endpoint.
+
+    Args:
+        name: Prometheus metric name.
+        source: Callable returning {labels dict as tuple of (key, value) pairs: number}.
+    """
+    _gauge_sources[name] = source
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """All recorded metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP ai_doctor_stage_seconds Time spent in each pipeline stage.",
+        "# TYPE ai_doctor_stage_seconds histogram",
+    ]
+    with _lock:
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        payloads = dict(_payload_bytes)
+
+    for key, histogram in sorted(histograms.items()):
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            lines.append(f"ai_doctor_stage_seconds_bucket{_format_labels(key, [('le', bound)])} {histogram[index]}")
+        count = histogram[len(LATENCY_BUCKETS)]
+        lines.append(f"ai_doctor_stage_seconds_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+        lines.append(f"ai_doctor_stage_seconds_sum{_format_labels(key)} {histogram[-1]:.6f}")
+        lines.append(f"ai_doctor_stage_seconds_count{_format_labels(key)} {count}")
+
+    lines.append("# HELP ai_doctor_stage_payload_bytes_total Bytes handled by each pipeline stage.")
+    lines.append("# TYPE ai_doctor_stage_payload_bytes_total counter")
+    for key, total in sorted(payloads.items()):
+        lines.append(f"ai_doctor_stage_payload_bytes_total{_format_labels(key)} {total}")
+
+    for name, source in sorted(_gauge_sources.items()):
+        lines.append(f"# TYPE {name} gauge")
+        try:
+            values = source()
+        except Exception as e:
+            logger.warning(f"metrics gauge {name} failed: {e}")
+            continue
+        for labels, value in sorted(values.items()):
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def cache_gauge(*caches):
+    """Gauge source reporting hit/miss counters of TieredCache instances."""
+    def source():
+        values = {}
+        for cache in caches:
+            for stat, value in cache.stats().items():
+                values[(("cache", cache.name), ("stat", stat))] = value
+        return values
+    return source
+
+
+def reset():
+    """Forget everything recorded so far. Used by benchmarks and tests."""
+    with _lock:
+        _histograms.clear()
+        _payload_bytes.clear()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import logging
+import platform
+import subprocess
+import functools
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+# "blocking" keeps the old behaviour of playing the clip before returning,
+# "background" starts the player and returns immediately, "none" skips playback
+# (headless servers). gradio_app switches to "none" unless AUDIO_PLAYBACK is set.
+BACKENDS = ("none", "background", "blocking")
+_backend = os.environ.get("AUDIO_PLAYBACK", "blocking")
+
+_LINUX_PLAYERS = [
+    ['mpg123', '-q'],
+    ['ffplay', '-nodisp', '-autoexit', '-loglevel', 'quiet'],
+    ['aplay', '-q'],
+]
+
+
+@functools.lru_cache(maxsize=None)
+def detect_player():
+    """
+    Find the command used to play an audio file on this machine, once per process.
+
+    Returns:
+        A list of command arguments to which the file path is appended, or None
+        if no player is available.
+    """
+    os_name = platform.system()
+    if os_name == "Darwin":  # macOS
+        return ['afplay'] if shutil.which('afplay') else None
+    if os_name == "Windows":
+        return ['powershell', '-c'] if shutil.which('powershell') else None
+    if os_name == "Linux":
+        for player in _LINUX_PLAYERS:
+            if shutil.which(player[0]):
+                return player
+    return None
+
+
+def _command(player, output_filepath, wait_seconds):
+    if player[0] == 'powershell':
+        return player + [f'Add-Type -AssemblyName presentationCore; $mediaPlayer = New-Object system.windows.media.mediaplayer; $mediaPlayer.open([uri]::new((Resolve-Path "{output_filepath}").Path)); $mediaPlayer.Play(); Start-Sleep {wait_seconds}']
+    return player + [output_filepath]
+
+
+def set_backend(name):
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown playback backend {name!r}, expected one of {BACKENDS}")
+    _backend = name
+
+
+def get_backend():
+    return _backend
+
+
+def play_audio(output_filepath, backend=None, wait_seconds=5):
+    """
+    Play an audio file through the configured backend.
+
+    Args:
+        output_filepath: Audio file to play.
+        backend: Overrides the process-wide backend for this call.
+        wait_seconds: How long the Windows player is kept alive for.
+
+    Returns:
+        The Popen handle for background playback, otherwise None.
+    """
+    backend = backend or _backend
+    if backend == "none":
+        return None
+
+    player = detect_player()
+    if player is None:
+        logger.warning("No suitable audio player found")
+        return None
+
+    command = _command(player, output_filepath, wait_seconds)
+    with span("playback", backend=backend, player=player[0]) as s:
+        try:
+            if backend == "background":
+                return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            subprocess.run(command, check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            s.set(outcome="error")
+            logger.warning(f"An error occurred while trying to play the audio: {e}")
+    return None
@@ -0,0 +1,59 @@
+import importlib
+import threading
+
+# Provider entry points as "module:attribute". Nothing is imported until the
+# entry point is first asked for, so a deployment only pays for the SDKs it uses.
+_registry = {
+    "stt.groq": "voice:transcribe_with_groq",
+    "vision.encode_image": "brain:encode_image_with_mime",
+    "vision.groq": "brain:analyze_image_with_query",
+    "vision.groq.async": "brain:analyze_image_with_query_async",
+    "vision.groq.stream": "brain:stream_image_with_query",
+    "vision.groq.budget": "brain:vision_budget",
+    "vision.groq.budget.async": "brain:vision_budget_async",
+    "tts.gtts": "doc_voice:synthesize_with_gtts",
+    "tts.elevenlabs": "doc_voice:synthesize_with_elevenlabs",
+    "tts.elevenlabs.speak": "doc_voice:text_to_speech_with_elevenlabs",
+    "tts.elevenlabs.stream": "doc_voice:stream_with_elevenlabs",
+}
+_loaded = {}
+_lock = threading.Lock()
+
+
+def register(name, target):
+    """
+    Add or replace a provider entry point.
+
+    Args:
+        name: Registry key, e.g. "tts.gtts".
+        target: "module:attribute" string, or the callable itself.
+    """
+    with _lock:
+        if callable(target):
+            _loaded[name] = target
+        else:
+            _loaded.pop(name, None)
+        _registry[name] = target
+
+
+def get(name):
+    """Return the entry point registered under name, importing its module on first use."""
+    provider = _loaded.get(name)
+    if provider is not None:
+        return provider
+    with _lock:
+        provider = _loaded.get(name)
+        if provider is None:
+            target = _registry[name]
+            if callable(target):
+                provider = target
+            else:
+                module_name, attribute = target.split(":")
+                provider = getattr(importlib.import_module(module_name), attribute)
+            _loaded[name] = provider
+    return provider
+
+
+def loaded():
+    """Names of the entry points imported so far."""
+    return sorted(_loaded)
@@ -0,0 +1,376 @@
+"""
+Token-bucket scheduler for Groq calls.
+
+Every model has its own budget: requests per minute (rpm), tokens per minute
+(tpm) and, for Whisper, audio seconds per hour (ash). A call waits until all of
+its model's buckets can pay for it. Waiting calls are served interactive first,
+then batch, and batch calls also leave BATCH_RESERVE of each bucket untouched
+so interactive requests from other processes still get through.
+
+Set GROQ_RATE_STATE to a file path to share the buckets between every worker
+process on the host (POSIX file locks); by default each process has its own.
+
+    with ratelimit.slot(model, tokens=1500) as s:
+        completion = client.chat.completions.create(...)
+        s.settle(completion.usage.total_tokens)
+"""
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import threading
+import contextlib
+import collections
+
+from metrics import register_gauge
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get("GROQ_RATE_LIMIT", "1") == "1"
+
+# Groq free-tier limits. Override with GROQ_RATE_LIMITS, a JSON object such as
+# {"whisper-large-v3": {"rpm": 300, "ash": 36000}}. Models not listed are not limited.
+DEFAULT_LIMITS = {
+    "whisper-large-v3": {"rpm": 20, "ash": 7200},
+    "meta-llama/llama-4-scout-17b-16e-instruct": {"rpm": 30, "tpm": 30000},
+}
+# (bucket name, seconds over which the limit is measured)
+_WINDOWS = {"rpm": ("requests", 60), "tpm": ("tokens", 60), "ash": ("audio_seconds", 3600)}
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+# Priority of calls made by this process; batch.py sets it to "batch".
+DEFAULT_PRIORITY = os.environ.get("GROQ_PRIORITY", "interactive")
+# Share of each bucket batch calls may not use.
+BATCH_RESERVE = float(os.environ.get("GROQ_BATCH_RESERVE", "0.25"))
+# How often a waiting call re-checks buckets other processes may have changed.
+POLL_SECONDS = 0.25
+# Waiting coroutines aren't woken by other calls finishing, so they poll more often.
+ASYNC_POLL_SECONDS = 0.05
+
+
+def _load_limits():
+    limits = {model: dict(budget) for model, budget in DEFAULT_LIMITS.items()}
+    override = os.environ.get("GROQ_RATE_LIMITS")
+    if override:
+        for model, budget in json.loads(override).items():
+            limits[model] = budget
+    return limits
+
+
+class MemoryState:
+    """Bucket levels kept in this process."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def transact(self, fn):
+        """Run fn(state dict) atomically and return its result."""
+        with self._lock:
+            return fn(self._data)
+
+
+class FileState:
+    """Bucket levels kept in a JSON file shared by processes on one host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def transact(self, fn):
+        with self._lock, open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    data = {}
+                result = fn(data)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _make_state():
+    path = os.environ.get("GROQ_RATE_STATE")
+    if not path:
+        return MemoryState()
+    if fcntl is None:
+        logger.warning("GROQ_RATE_STATE needs POSIX file locks; using per-process rate limits")
+        return MemoryState()
+    return FileState(path)
+
+
+class Slot:
+    """
+    Budget taken for one call, returned by reserve() and yielded by slot().
+
+    Use it as a context manager around the call: a 429 raised inside blocks
+    the model for the Retry-After period (5s if missing) before it propagates.
+    settle() corrects the token estimate once usage is known.
+    """
+
+    def __init__(self, scheduler, model, tokens):
+        self.scheduler = scheduler
+        self.model = model
+        self.tokens = tokens
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and getattr(exc, "status_code", None) == 429:
+            self.scheduler.block(self.model, _retry_after(exc))
+        return False
+
+    def settle(self, actual_tokens):
+        if actual_tokens is None or not self.tokens:
+            return
+        self.scheduler.charge(self.model, {"tokens": actual_tokens - self.tokens})
+        self.tokens = actual_tokens
+
+
+class Scheduler:
+    def __init__(self, limits=None, state=None):
+        self.limits = _load_limits() if limits is None else limits
+        self.state = state or MemoryState()
+        self.stats = collections.defaultdict(collections.Counter)
+        self._waiters = collections.defaultdict(list)  # model -> heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _buckets(self, model):
+        # (bucket name, capacity, refill per second)
+        buckets = []
+        for key, limit in self.limits.get(model, {}).items():
+            if key in _WINDOWS and limit:
+                name, window = _WINDOWS[key]
+                buckets.append((name, float(limit), float(limit) / window))
+        return buckets
+
+    def _try_take(self, model, costs, priority):
+        """Take costs from the model's buckets if they all cover it. Returns seconds to wait, 0 if taken."""
+        buckets = self._buckets(model)
+
+        def take(data):
+            now = time.time()
+            entry = data.setdefault(model, {})
+            blocked_until = entry.get("blocked_until", 0)
+            if blocked_until > now:
+                return blocked_until - now
+
+            levels = {}
+            wait = 0.0
+            for name, capacity, rate in buckets:
+                level, updated = entry.get(name, (capacity, now))
+                level = min(capacity, level + (now - updated) * rate)
+                levels[name] = level
+                reserve = capacity * BATCH_RESERVE if priority == "batch" else 0.0
+                # A single call larger than the whole bucket waits for a full bucket.
+                need = min(costs.get(name, 0), capacity - reserve) + reserve
+                if level < need:
+                    wait = max(wait, (need - level) / rate)
+            if wait:
+                return wait
+            for name, capacity, rate in buckets:
+                entry[name] = (levels[name] - min(costs.get(name, 0), capacity), now)
+            return 0.0
+
+        return self.state.transact(take)
+
+    def acquire(self, model, costs, priority=None, wait=True):
+        """
+        Block until costs ({bucket name: amount}) fit the model's budget, then take them.
+
+        With wait=False, take them only if that is possible right away and no
+        other call is waiting for the model. Returns whether they were taken.
+        """
+        if not RATE_LIMIT_ENABLED or not self._buckets(model):
+            return True
+        priority = priority or DEFAULT_PRIORITY
+        costs = dict(costs, requests=costs.get("requests", 1))
+        if not wait:
+            with self._condition:
+                taken = not self._waiters[model] and not self._try_take(model, costs, priority)
+            if taken:
+                self._record_wait(model, 0.0)
+            return taken
+
+        entry = (PRIORITIES.get(priority, 0), next(self._sequence))
+        start = time.perf_counter()
+        with self._condition:
+            waiters = self._waiters[model]
+            heapq.heappush(waiters, entry)
+            try:
+                while True:
+                    # Only the model's first waiter in priority order may take from its buckets.
+                    wait = POLL_SECONDS
+                    if waiters[0] == entry:
+                        wait = self._try_take(model, costs, priority)
+                        if not wait:
+                            break
+                    self._condition.wait(timeout=min(wait, POLL_SECONDS))
+            finally:
+                waiters.remove(entry)
+                heapq.heapify(waiters)
+                self._condition.notify_all()
+
+        self._record_wait(model, time.perf_counter() - start)
+        return True
+
+    async def acquire_async(self, model, costs, priority=None, wait=True):
+        """
+        acquire() for coroutines. The wait polls the buckets with asyncio.sleep,
+        so a call waiting for budget holds no thread.
+        """
+        if not wait:
+            return self.acquire(model, costs, priority, wait=False)
+        if not RATE_LIMIT_ENABLED or not self._buckets(model):
+            return True
+        priority = priority or DEFAULT_PRIORITY
+        costs = dict(costs, requests=costs.get("requests", 1))
+        entry = (PRIORITIES.get(priority, 0), next(self._sequence))
+        start = time.perf_counter()
+        with self._condition:
+            waiters = self._waiters[model]
+            heapq.heappush(waiters, entry)
+        try:
+            while True:
+                with self._condition:
+                    wait = self._try_take(model, costs, priority) if waiters[0] == entry else POLL_SECONDS
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        finally:
+            with self._condition:
+                waiters.remove(entry)
+                heapq.heapify(waiters)
+                self._condition.notify_all()
+
+        self._record_wait(model, time.perf_counter() - start)
+        return True
+
+    def _record_wait(self, model, waited):
+        with self._condition:
+            stats = self.stats[model]
+            stats["calls"] += 1
+            if waited > 0.001:
+                stats["waits"] += 1
+                stats["wait_ms_total"] += int(waited * 1000)
+
+    def charge(self, model, costs):
+        """Adjust bucket levels after the fact, e.g. when a token estimate was off."""
+        buckets = self._buckets(model)
+
+        def adjust(data):
+            now = time.time()
+            entry = data.setdefault(model, {})
+            for name, capacity, rate in buckets:
+                if name in costs:
+                    level, updated = entry.get(name, (capacity, now))
+                    level = min(capacity, level + (now - updated) * rate)
+                    entry[name] = (min(capacity, level - costs[name]), now)
+
+        if buckets:
+            self.state.transact(adjust)
+
+    def block(self, model, seconds):
+        """Hold every caller of model back for seconds, e.g. after a 429 with Retry-After."""
+        until = time.time() + seconds
+
+        def update(data):
+            entry = data.setdefault(model, {})
+            entry["blocked_until"] = max(entry.get("blocked_until", 0), until)
+
+        self.state.transact(update)
+        with self._condition:
+            self.stats[model]["throttled"] += 1
+
+    def reserve(self, model, tokens=0, audio_seconds=0, priority=None, wait=True):
+        """
+        Take budget for one call without starting it, e.g. before a timed attempt.
+
+        Returns:
+            A Slot, or None if wait is False and the budget isn't there right away.
+        """
+        if not self.acquire(model, {"tokens": tokens, "audio_seconds": audio_seconds}, priority, wait=wait):
+            return None
+        return Slot(self, model, tokens)
+
+    async def areserve(self, model, tokens=0, audio_seconds=0, priority=None, wait=True):
+        """reserve() for coroutines; waiting holds no thread (see acquire_async)."""
+        costs = {"tokens": tokens, "audio_seconds": audio_seconds}
+        if not await self.acquire_async(model, costs, priority, wait=wait):
+            return None
+        return Slot(self, model, tokens)
+
+    @contextlib.contextmanager
+    def slot(self, model, tokens=0, audio_seconds=0, priority=None):
+        """Wait for room in model's budget, then run the block (see Slot)."""
+        with self.reserve(model, tokens, audio_seconds, priority) as budget:
+            yield budget
+
+
+    @contextlib.asynccontextmanager
+    async def aslot(self, model, tokens=0, audio_seconds=0, priority=None):
+        """slot() for coroutines; waiting holds no thread."""
+        with await self.areserve(model, tokens, audio_seconds, priority) as budget:
+            yield budget
+
+
+def _retry_after(error, default=5.0):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", default))
+    except (TypeError, ValueError):
+        return default
+
+
+scheduler = Scheduler(state=_make_state())
+
+
+def reserve(model, tokens=0, audio_seconds=0, priority=None, wait=True):
+    """scheduler.reserve(...) on the process-wide scheduler."""
+    return scheduler.reserve(model, tokens=tokens, audio_seconds=audio_seconds, priority=priority, wait=wait)
+
+
+async def areserve(model, tokens=0, audio_seconds=0, priority=None, wait=True):
+    """scheduler.areserve(...) on the process-wide scheduler."""
+    return await scheduler.areserve(model, tokens=tokens, audio_seconds=audio_seconds, priority=priority, wait=wait)
+
+
+def slot(model, tokens=0, audio_seconds=0, priority=None):
+    """scheduler.slot(...) on the process-wide scheduler."""
+    return scheduler.slot(model, tokens=tokens, audio_seconds=audio_seconds, priority=priority)
+
+
+def aslot(model, tokens=0, audio_seconds=0, priority=None):
+    """scheduler.aslot(...) on the process-wide scheduler."""
+    return scheduler.aslot(model, tokens=tokens, audio_seconds=audio_seconds, priority=priority)
+
+
+def _gauge():
+    values = {}
+    with scheduler._condition:
+        for model, counters in scheduler.stats.items():
+            for stat, value in counters.items():
+                values[(("model", model), ("stat", stat))] = value
+    return values
+
+
+register_gauge("ai_doctor_rate_limit", _gauge)
@@ -0,0 +1,386 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+import collections
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from metrics import register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Turn timeouts, retries, hedging and circuit breaking off with RESILIENCE=0.
+RESILIENCE_ENABLED = os.environ.get("RESILIENCE", "1") == "1"
+# Consecutive failures that open a provider's breaker, and how long it stays
+# open before one trial call is let through.
+BREAKER_FAILURES = int(os.environ.get("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+# A duplicate request is sent once the first has taken longer than this
+# quantile of recent latencies. Nothing is hedged until there are enough samples.
+HEDGE_QUANTILE = float(os.environ.get("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+# Full-jitter exponential backoff between retries.
+RETRY_BACKOFF = 0.25
+RETRY_BACKOFF_CAP = 4.0
+
+# Attempts run here so a caller can stop waiting on them. A timed-out or
+# out-raced attempt is not interrupted; it finishes in the background.
+_executor = ThreadPoolExecutor(max_workers=int(os.environ.get("RESILIENCE_WORKERS", "64")),
+                               thread_name_prefix="resilience")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose breaker is open."""
+    retryable = False
+
+
+@dataclass
+class Policy:
+    timeout: float
+    retries: int
+    hedge: bool
+
+
+def _policy(name, timeout, retries, hedge):
+    # e.g. ELEVENLABS_TIMEOUT, GROQ_VISION_RETRIES, GTTS_HEDGE=0
+    prefix = name.upper().replace("-", "_")
+    return Policy(
+        timeout=float(os.environ.get(f"{prefix}_TIMEOUT", timeout)),
+        retries=int(os.environ.get(f"{prefix}_RETRIES", retries)),
+        hedge=os.environ.get(f"{prefix}_HEDGE", "1" if hedge else "0") == "1"
+    )
+
+
+POLICIES = {
+    "groq-stt": _policy("groq-stt", timeout=30, retries=2, hedge=False),
+    "groq-vision": _policy("groq-vision", timeout=30, retries=2, hedge=True),
+    "elevenlabs": _policy("elevenlabs", timeout=20, retries=1, hedge=True),
+    "gtts": _policy("gtts", timeout=15, retries=2, hedge=True),
+}
+DEFAULT_POLICY = Policy(timeout=30, retries=2, hedge=False)
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after failure_threshold consecutive failures. After
+    reset_timeout one trial call is allowed (half open); it closes the breaker
+    on success and reopens it on failure.
+    """
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURES
+        self.reset_timeout = BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_total = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a call that says nothing about the provider's health, e.g. a 429."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_total += 1
+                    logger.warning(f"{self.name} circuit breaker opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Provider:
+    """Timeouts, jittered retries, hedging and a circuit breaker around one upstream service."""
+
+    def __init__(self, name, policy=None, breaker=None):
+        self.name = name
+        self.policy = policy or POLICIES.get(name, DEFAULT_POLICY)
+        self.breaker = breaker or CircuitBreaker(name)
+        self.counters = collections.Counter()
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def hedge_delay(self):
+        """Seconds to wait before sending a duplicate request, or None if hedging is off."""
+        if not self.policy.hedge:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * HEDGE_QUANTILE))]
+
+    def _timed(self, fn, args, kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        return result
+
+    def _attempt(self, fn, args, kwargs, admit=None):
+        # Waiting for rate budget happens before the clock starts, so it is
+        # never mistaken for a slow provider.
+        if admit is not None:
+            kwargs = dict(kwargs, budget=admit(True))
+        deadline = time.monotonic() + self.policy.timeout
+        primary = _executor.submit(self._timed, fn, args, kwargs)
+        pending = {primary}
+        hedge = None
+
+        delay = self.hedge_delay()
+        if delay is not None and delay < self.policy.timeout:
+            done, _ = wait(pending, timeout=delay)
+            if not done:
+                hedge_kwargs = _hedge_kwargs(admit(False) if admit else None, admit, kwargs)
+                if hedge_kwargs is None:
+                    self._count("hedges_skipped")
+                else:
+                    hedge = _executor.submit(self._timed, fn, args, hedge_kwargs)
+                    pending.add(hedge)
+                    self._count("hedged")
+
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        raise TimeoutError(f"{self.name} did not answer within {self.policy.timeout}s")
+
+    def call(self, fn, *args, admit=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) under this provider's policy.
+
+        fn may run more than once, concurrently when hedged, so it must be safe
+        to repeat. Exceptions with retryable = False are raised without retrying.
+
+        admit, if given, takes rate budget for one attempt before its timeout
+        starts: admit(True) waits for it, admit(False) returns None instead of
+        waiting (a hedge is then skipped). Its result is passed to fn as budget=.
+
+        Raises:
+            CircuitOpenError: The breaker is open.
+            TimeoutError: The last attempt exceeded the policy timeout.
+        """
+        if not RESILIENCE_ENABLED:
+            if admit is not None:
+                kwargs = dict(kwargs, budget=admit(True))
+            return fn(*args, **kwargs)
+
+        self._count("calls")
+        attempts = self.policy.retries + 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(f"{self.name} circuit breaker is open")
+            try:
+                result = self._attempt(fn, args, kwargs, admit)
+            except Exception as e:
+                # Being throttled is the rate limiter's business, not an outage.
+                if getattr(e, "status_code", None) == 429:
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                if attempt + 1 >= attempts or not getattr(e, "retryable", True):
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                logger.warning(f"{self.name} attempt {attempt + 1} failed ({e}), retrying")
+                time.sleep(random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF * 2 ** attempt)))
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _attempt_async(self, coro_fn, args, kwargs, admit=None):
+        if admit is not None:
+            kwargs = dict(kwargs, budget=await admit(True))
+        deadline = time.monotonic() + self.policy.timeout
+
+        async def timed(kwargs=kwargs):
+            start = time.perf_counter()
+            result = await coro_fn(*args, **kwargs)
+            with self._lock:
+                self._latencies.append(time.perf_counter() - start)
+            return result
+
+        primary = asyncio.ensure_future(timed())
+        pending = {primary}
+        hedge = None
+        error = None
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and delay < self.policy.timeout:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    hedge_kwargs = _hedge_kwargs(await admit(False) if admit else None, admit, kwargs)
+                    if hedge_kwargs is None:
+                        self._count("hedges_skipped")
+                    else:
+                        hedge = asyncio.ensure_future(timed(hedge_kwargs))
+                        pending.add(hedge)
+                        self._count("hedged")
+
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+        finally:
+            # Unlike threads, coroutines can be stopped: cancel the losers.
+            for task in pending:
+                task.cancel()
+
+        if error is not None and not pending:
+            raise error
+        self._count("timeouts")
+        raise TimeoutError(f"{self.name} did not answer within {self.policy.timeout}s")
+
+    async def acall(self, coro_fn, *args, admit=None, **kwargs):
+        """
+        call() for coroutine functions; attempts that time out or lose a hedge
+        are cancelled. admit is a coroutine function here.
+        """
+        if not RESILIENCE_ENABLED:
+            if admit is not None:
+                kwargs = dict(kwargs, budget=await admit(True))
+            return await coro_fn(*args, **kwargs)
+
+        self._count("calls")
+        attempts = self.policy.retries + 1
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                self._count("rejected")
+                raise CircuitOpenError(f"{self.name} circuit breaker is open")
+            try:
+                result = await self._attempt_async(coro_fn, args, kwargs, admit)
+            except Exception as e:
+                # Being throttled is the rate limiter's business, not an outage.
+                if getattr(e, "status_code", None) == 429:
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                if attempt + 1 >= attempts or not getattr(e, "retryable", True):
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                logger.warning(f"{self.name} attempt {attempt + 1} failed ({e}), retrying")
+                await asyncio.sleep(random.uniform(0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF * 2 ** attempt)))
+            else:
+                self.breaker.record_success()
+                return result
+
+    def stats(self):
+        hedged = self.counters["hedged"]
+        delay = self.hedge_delay()
+        stats = {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "opened_total": self.breaker.opened_total,
+            "hedge_win_rate": self.counters["hedge_wins"] / hedged if hedged else 0.0,
+            "hedge_delay_seconds": delay if delay is not None else 0.0,
+        }
+        for name in ("calls", "retries", "timeouts", "failures", "rejected", "hedged", "hedge_wins", "hedges_skipped"):
+            stats[name] = self.counters[name]
+        return stats
+
+
+def _hedge_kwargs(budget, admit, kwargs):
+    # kwargs for a hedge, or None when it would have to wait for rate budget.
+    if admit is None:
+        return kwargs
+    return None if budget is None else dict(kwargs, budget=budget)
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def provider(name):
+    """The shared Provider for name, created with POLICIES[name] on first use."""
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = Provider(name)
+        return _providers[name]
+
+
+def call(name, fn, *args, admit=None, **kwargs):
+    """provider(name).call(fn, *args, admit=admit, **kwargs)"""
+    return provider(name).call(fn, *args, admit=admit, **kwargs)
+
+
+async def acall(name, coro_fn, *args, admit=None, **kwargs):
+    """await provider(name).acall(coro_fn, *args, admit=admit, **kwargs)"""
+    return await provider(name).acall(coro_fn, *args, admit=admit, **kwargs)
+
+
+def stats():
+    """Breaker state, retry and hedge counters per provider, for tuning the policies."""
+    with _providers_lock:
+        providers = list(_providers.values())
+    return {p.name: p.stats() for p in providers}
+
+
+_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+def _gauge():
+    values = {}
+    for name, provider_stats in stats().items():
+        for stat, value in provider_stats.items():
+            if stat == "state":
+                value = _STATE_VALUES[value]
+            values[(("provider", name), ("stat", stat))] = value
+    return values
+
+
+# state is 0 closed, 1 half open, 2 open.
+register_gauge("ai_doctor_resilience", _gauge)
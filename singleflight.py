@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import collections
+
+
+class Cancelled(Exception):
+    """The leader of a flight stopped before producing a result; followers should run it themselves."""
+
+
+class Flight:
+    """One in-flight computation that followers can wait on."""
+
+    def __init__(self):
+        self.followers = 0
+        self._done = threading.Event()
+        self._result = None
+        self._error = None
+
+    def wait(self, timeout=None):
+        """Block until the leader finishes, then return its result or raise its error."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("single-flight leader did not finish in time")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    async def wait_async(self, poll=0.02):
+        """wait() for coroutines, without holding a thread."""
+        while not self._done.is_set():
+            await asyncio.sleep(poll)
+        return self.wait(0)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one.
+
+    The first caller for a key becomes the leader and does the work; callers
+    arriving while it runs wait and get the same result (or exception). The
+    key is forgotten as soon as the leader finishes, so this never caches.
+
+        flights = SingleFlight("consultation")
+        result = flights.do(key, lambda: expensive(...))
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = collections.Counter()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """
+        Returns:
+            (flight, is_leader). A leader must call finish(key, flight, ...) exactly once.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.counters["followers"] += 1
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.counters["leaders"] += 1
+            return flight, True
+
+    def finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight._result = result
+        flight._error = error
+        flight._done.set()
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers with this key and return its result to each."""
+        while True:
+            flight, leader = self.join(key)
+            if leader:
+                break
+            try:
+                return flight.wait()
+            except Cancelled:
+                continue
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, flight, error=e if isinstance(e, Exception) else Cancelled())
+            raise
+        self.finish(key, flight, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            stats = {"leaders": self.counters["leaders"], "followers": self.counters["followers"],
+                     "in_flight": len(self._flights)}
+        return stats
+
+
+def flight_gauge(*groups):
+    """Gauge source reporting leader/follower counts of SingleFlight instances."""
+    def source():
+        values = {}
+        for group in groups:
+            for stat, value in group.stats().items():
+                values[(("flight", group.name), ("stat", stat))] = value
+        return values
+    return source
@@ -0,0 +1,57 @@
+import os
+import asyncio
+import threading
+import contextlib
+
+# Maximum number of requests inside each pipeline stage at once, per process.
+# The Gradio queue decides how many requests run; these keep any one provider
+# from being hit by all of them together.
+STAGE_LIMITS = {
+    "stt": int(os.environ.get("STT_CONCURRENCY", "4")),
+    "vision": int(os.environ.get("VISION_CONCURRENCY", "4")),
+    "tts": int(os.environ.get("TTS_CONCURRENCY", "4")),
+}
+
+# Requests the Gradio queue runs concurrently and the most it will hold waiting.
+QUEUE_CONCURRENCY = int(os.environ.get("QUEUE_CONCURRENCY", str(max(STAGE_LIMITS.values()) * 2)))
+# Same for the async handlers, which hold no thread while they wait.
+ASYNC_QUEUE_CONCURRENCY = int(os.environ.get("ASYNC_QUEUE_CONCURRENCY", str(QUEUE_CONCURRENCY * 8)))
+QUEUE_MAX_SIZE = int(os.environ.get("QUEUE_MAX_SIZE", "200"))
+
+_semaphores = {stage: threading.BoundedSemaphore(limit) for stage, limit in STAGE_LIMITS.items()}
+
+
+@contextlib.contextmanager
+def stage_slot(stage):
+    """Hold one of the concurrency slots of a pipeline stage ("stt", "vision" or "tts")."""
+    semaphore = _semaphores[stage]
+    semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def limited(stage, fn):
+    """Wrap fn so every call runs inside a slot of the given stage."""
+    def wrapper(*args, **kwargs):
+        with stage_slot(stage):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@contextlib.asynccontextmanager
+async def astage_slot(stage):
+    """
+    stage_slot for coroutines. Shares the slots with threaded callers; waits by
+    polling so the event loop is never blocked and no thread is held.
+    """
+    semaphore = _semaphores[stage]
+    delay = 0.005
+    while not semaphore.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+    try:
+        yield
+    finally:
+        semaphore.release()
@@ -0,0 +1,102 @@
+"""
+Pre-synthesized audio for the app's fixed replies.
+
+The store holds one MP3 per (text, language, engine) and is filled once at
+startup; requests then only read from it. Clips whose text no longer appears
+in the message tables are removed on the next build, and changed messages get
+new clips, so editing the tables only needs a restart. To synthesize
+everything again (e.g. after changing voice settings):
+
+    python static_audio.py --rebuild
+"""
+import os
+import json
+import stat
+import logging
+import tempfile
+import threading
+import unicodedata
+
+from cache_store import make_key
+
+logger = logging.getLogger(__name__)
+
+STATIC_AUDIO_DIR = os.environ.get("STATIC_AUDIO_DIR") or os.path.join(tempfile.gettempdir(), "ai_doctor_static_audio")
+MANIFEST = "manifest.json"
+
+
+class StaticAudioStore:
+    """Read-only MP3 clips for fixed texts, keyed on (text, language, engine)."""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path_for(self, text, language, engine):
+        text = unicodedata.normalize("NFC", " ".join(text.split()))
+        return os.path.join(self.root, make_key(text, language, engine)[:32] + ".mp3")
+
+    def get(self, text, language, engine):
+        """Path of the clip for text, or None if it hasn't been built."""
+        path = self.path_for(text, language, engine)
+        return path if os.path.exists(path) else None
+
+    def build(self, entries, synthesizers, rebuild=False):
+        """
+        Synthesize every missing clip and delete clips that are no longer listed.
+
+        Args:
+            entries: Iterable of (text, language, engine).
+            synthesizers: {engine: callable (text, output_filepath, language)}.
+            rebuild: Synthesize all clips again, not only missing ones.
+
+        Returns:
+            {"built": n, "kept": n, "failed": n, "removed": n}
+        """
+        counts = {"built": 0, "kept": 0, "failed": 0, "removed": 0}
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            manifest = {}
+            for text, language, engine in entries:
+                path = self.path_for(text, language, engine)
+                name = os.path.basename(path)
+                manifest[name] = {"text": text, "language": language, "engine": engine}
+                if os.path.exists(path) and not rebuild:
+                    counts["kept"] += 1
+                    continue
+                part_path = path + ".part"
+                try:
+                    synthesizers[engine](text, part_path, language)
+                    os.chmod(part_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                    os.replace(part_path, path)
+                    counts["built"] += 1
+                except Exception as e:
+                    logger.warning(f"Could not synthesize static {engine}/{language} clip: {e}")
+                    counts["failed"] += 1
+                finally:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+
+            for entry in os.scandir(self.root):
+                if entry.name.endswith(".mp3") and entry.name not in manifest:
+                    os.remove(entry.path)
+                    counts["removed"] += 1
+
+            with open(os.path.join(self.root, MANIFEST), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=1)
+        return counts
+
+
+static_audio = StaticAudioStore(STATIC_AUDIO_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Synthesize every clip again")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from consultation import build_static_audio
+    print(build_static_audio(rebuild=args.rebuild))
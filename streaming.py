@@ -0,0 +1,116 @@
+import os
+import re
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Sentence terminators, including the Devanagari danda used by Hindi and Marathi.
+SENTENCE_END = re.compile(r"[.!?।॥]+[\"'”’)\]]*\s+")
+# Fragments shorter than this are held back and merged into the next sentence,
+# so "Dr. Rao" or a stray "Ok." does not become its own TTS request.
+MIN_SENTENCE_CHARS = int(os.environ.get("STREAM_MIN_SENTENCE_CHARS", "20"))
+TTS_WORKERS = int(os.environ.get("STREAM_TTS_WORKERS", "3"))
+
+
+def iter_sentences(text_chunks, min_chars=None):
+    """
+    Re-chunk a stream of text deltas into whole sentences.
+
+    Args:
+        text_chunks: Iterable of text pieces, e.g. LLM stream deltas.
+        min_chars: Minimum length of an emitted sentence. Defaults to STREAM_MIN_SENTENCE_CHARS.
+    """
+    min_chars = MIN_SENTENCE_CHARS if min_chars is None else min_chars
+    buffer = ""
+    for chunk in text_chunks:
+        buffer += chunk
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            if match.end() - start >= min_chars:
+                yield buffer[start:match.end()].strip()
+                start = match.end()
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def _strip_id3(data):
+    # An ID3v2 tag in the middle of the stitched file confuses some players.
+    if data[:3] != b"ID3" or len(data) < 10:
+        return data
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    return data[10 + size:]
+
+
+def concatenate_mp3(segment_paths, output_filepath):
+    """Join MP3 segments into one file. MP3 frames are self-contained, so this is a plain byte join."""
+    with open(output_filepath, "wb") as out:
+        for index, path in enumerate(segment_paths):
+            with open(path, "rb") as f:
+                data = f.read()
+            out.write(data if index == 0 else _strip_id3(data))
+
+
+def pipelined_speech(sentences, output_filepath, synthesize, on_segment=None, workers=None):
+    """
+    Synthesize sentences while they are still being produced, then stitch the audio.
+
+    Each sentence is handed to a TTS worker the moment it arrives, so speech for
+    the first sentence is ready while the model is still writing the rest.
+
+    Args:
+        sentences: Iterable of sentences (typically iter_sentences over an LLM stream).
+        output_filepath: Where the stitched MP3 is written.
+        synthesize: Callable (text, output_filepath) producing one MP3 segment.
+        on_segment: Optional callback (index, segment_path, text) called in order
+            as soon as each segment is ready, e.g. to start playing it.
+        workers: Number of concurrent TTS calls. Defaults to STREAM_TTS_WORKERS.
+
+    Returns:
+        The full text, sentences joined with spaces. If a segment fails, the
+        remaining sentences are still collected but no more are synthesized
+        and output_filepath is not written; the caller can synthesize the text
+        in one piece instead.
+    """
+    workdir = tempfile.mkdtemp(prefix="ai_doctor_stream_")
+    texts = []
+    futures = []
+    segment_paths = []
+    failed = []
+
+    def deliver(block):
+        # Hand finished segments over strictly in order.
+        while not failed and len(segment_paths) < len(futures):
+            index = len(segment_paths)
+            future, path = futures[index]
+            if not block and not future.done():
+                return
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning(f"Speech for sentence {index + 1} failed ({e}), not stitching the reply audio")
+                failed.append(index)
+                return
+            segment_paths.append(path)
+            if on_segment is not None and os.path.exists(path):
+                on_segment(index, path, texts[index])
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or TTS_WORKERS) as pool:
+            for index, sentence in enumerate(sentences):
+                path = os.path.join(workdir, f"segment_{index:03d}.mp3")
+                texts.append(sentence)
+                if not failed:
+                    futures.append((pool.submit(synthesize, sentence, path), path))
+                    deliver(block=False)
+            deliver(block=True)
+
+        existing = [path for path in segment_paths if os.path.exists(path)]
+        if existing and not failed:
+            concatenate_mp3(existing, output_filepath)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return " ".join(texts)
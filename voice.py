@@ -1,57 +1,196 @@
+import os
 import logging
-import speech_recognition as sr
-from pydub import AudioSegment
 from io import BytesIO
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
-def record_audio(file_path, timeout=20, phrase_time_limit=None):
+def record_audio(file_path=None, timeout=20, phrase_time_limit=None):
     """
-    Simplified function to record audio from the microphone and save it as an MP3 file.
+    Record a question from the microphone.
+
+    The capture stays in memory as 16 kHz mono 16-bit audio and can be passed
+    straight to transcribe_with_groq. Nothing is written to disk unless
+    file_path is given, in which case it is saved in the format of its
+    extension (.flac or .wav stay lossless, .mp3 is encoded at 128k).
 
     Args:
-    file_path (str): Path to save the recorded audio file.
+    file_path (str): Optional path to also save the recording to.
     timeout (int): Maximum time to wait for a phrase to start (in seconds).
-    phrase_time_lfimit (int): Maximum time for the phrase to be recorded (in seconds).
+    phrase_time_limit (int): Maximum time for the phrase to be recorded (in seconds).
+
+    Returns:
+    pydub.AudioSegment, or None if recording failed.
     """
+    # Only needed for local recording; kept out of module import so servers don't load them.
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
     recognizer = sr.Recognizer()
     
     try:
         with sr.Microphone() as source:
-            logging.info("Adjusting for ambient noise...")
+            logger.info("Adjusting for ambient noise...")
             recognizer.adjust_for_ambient_noise(source, duration=1)
-            logging.info("Start speaking now...")
+            logger.info("Start speaking now...")
             
             
             audio_data = recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
-            logging.info("Recording complete.")
+            logger.info("Recording complete.")
             
            
-            wav_data = audio_data.get_wav_data()
-            audio_segment = AudioSegment.from_wav(BytesIO(wav_data))
-            audio_segment.export(file_path, format="mp3", bitrate="128k")
-            
-            logging.info(f"Audio saved to {file_path}")
+            # Raw PCM at the rate Whisper wants; no WAV container, no ffmpeg.
+            audio_segment = AudioSegment(
+                data=audio_data.get_raw_data(convert_rate=16000, convert_width=2),
+                sample_width=2,
+                frame_rate=16000,
+                channels=1
+            )
+
+            if file_path:
+                save_audio(audio_segment, file_path)
+                logger.info(f"Audio saved to {file_path}")
+            return audio_segment
 
     except Exception as e:
-        logging.error(f"An error occurred: {e}")
+        logger.error(f"An error occurred: {e}")
+        return None
+
+
+def save_audio(audio_segment, file_path):
+    """Write a recording to file_path in the format given by its extension."""
+    codec = os.path.splitext(file_path)[1].lstrip(".").lower() or "wav"
+    if codec == "mp3":
+        audio_segment.export(file_path, format="mp3", bitrate="128k")
+        return
+    _, data = export(audio_segment, codec)
+    with open(file_path, "wb") as f:
+        f.write(data)
 
 audio_filepath="patient_voice_test_for_patient.mp3"
 
-import os
-from groq import Groq
+import tempfile
+import ratelimit
+import resilience
+from concurrent.futures import ThreadPoolExecutor
+from groq_pool import get_groq_client
+from metrics import span, register_gauge, cache_gauge
+from audio_prep import decode_for_stt, prepare_for_stt, normalize, export
+from cache_store import TieredCache, hash_bytes, hash_file, make_key, ttl_from_env
 
 GROQ_API_KEY=os.environ.get("GROQ_API_KEY")
 stt_model="whisper-large-v3"
+# Chunks of one long recording transcribed at the same time.
+STT_CHUNK_WORKERS=int(os.environ.get("STT_CHUNK_WORKERS", "4"))
 
-def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY):
-    client=Groq(api_key=GROQ_API_KEY)
-    
-    audio_file=open(audio_filepath, "rb")
-    transcription=client.audio.transcriptions.create(
-        model=stt_model,
-        file=audio_file,
-        language="en"
+# Transcripts keyed on the hash of the decoded samples (not the file bytes), the
+# model and the language, so container or metadata differences don't cause misses.
+STT_CACHE_ENABLED=os.environ.get("STT_CACHE", "1") == "1"
+transcription_cache=TieredCache(
+    "transcription",
+    max_entries=int(os.environ.get("STT_CACHE_SIZE", "1024")),
+    ttl=ttl_from_env("STT_CACHE_TTL"),
+    directory=os.environ.get("STT_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "ai_doctor_stt_cache"),
+    max_disk_bytes=int(os.environ.get("STT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+)
+register_gauge("ai_doctor_transcription_cache", cache_gauge(transcription_cache))
+
+
+# Groq bills every transcription request as at least this many seconds of audio.
+MIN_BILLED_AUDIO_SECONDS=10
+
+
+def _upload_once(client, stt_model, upload, language, budget):
+    with budget:
+        if isinstance(upload, tuple):
+            transcription=client.audio.transcriptions.create(model=stt_model, file=upload, language=language)
+        else:
+            with open(upload, "rb") as audio_file:
+                transcription=client.audio.transcriptions.create(model=stt_model, file=audio_file, language=language)
+    return transcription.text
+
+
+def _transcribe_upload(client, stt_model, upload, language, audio_seconds=0):
+    """
+    Transcribe one upload, a (filename, bytes) tuple or a path, under the
+    groq-stt resilience policy, so a slow chunk is retried on its own instead
+    of the whole recording. Rate budget is taken before each attempt is timed.
+    """
+    audio_seconds=max(MIN_BILLED_AUDIO_SECONDS, audio_seconds)
+    return resilience.call(
+        "groq-stt", _upload_once, client, stt_model, upload, language,
+        admit=lambda wait: ratelimit.reserve(stt_model, audio_seconds=audio_seconds, wait=wait)
     )
 
-    return transcription.text
\ No newline at end of file
+
+def _is_segment(audio):
+    return hasattr(audio, "raw_data") and hasattr(audio, "frame_rate")
+
+
+def transcribe_with_groq(stt_model, audio_filepath, GROQ_API_KEY, language="en", filename="audio.wav"):
+    """
+    Transcribe audio with Groq Whisper.
+
+    audio_filepath is a path, or in-memory audio: a pydub AudioSegment (as
+    returned by record_audio) or the bytes of an encoded audio file named by
+    filename. In-memory audio is never written to disk.
+
+    The audio is first resampled to 16 kHz mono, trimmed of leading/trailing
+    silence and, if long, split at pauses (see audio_prep). Chunks are
+    transcribed concurrently and joined in order. If the audio cannot be
+    decoded the original file is uploaded unchanged.
+
+    Results are cached on the decoded audio (see transcription_cache).
+    """
+    with span("stt", model=stt_model) as s:
+        upload=None
+        if _is_segment(audio_filepath):
+            segment=normalize(audio_filepath)
+        elif isinstance(audio_filepath, (bytes, bytearray)):
+            upload=(filename, bytes(audio_filepath))
+            segment=decode_for_stt(BytesIO(upload[1]), format=os.path.splitext(filename)[1].lstrip(".") or None)
+        else:
+            segment=decode_for_stt(audio_filepath)
+
+        if segment is not None:
+            audio_hash=hash_bytes(segment.raw_data)
+        else:
+            audio_hash=hash_bytes(upload[1]) if upload else hash_file(audio_filepath)
+        cache_key=make_key(audio_hash, stt_model, language)
+        if STT_CACHE_ENABLED:
+            text=transcription_cache.get(cache_key)
+            if text is not None:
+                s.set(outcome="cache_hit")
+                return text
+
+        text=_transcribe(stt_model, upload or audio_filepath, GROQ_API_KEY, language, segment, s)
+        if STT_CACHE_ENABLED:
+            transcription_cache.set(cache_key, text)
+        return text
+
+
+def _transcribe(stt_model, original, GROQ_API_KEY, language, segment, s):
+    # original: path, (filename, bytes) or AudioSegment, uploaded as is when the
+    # audio could not be prepared.
+    client=get_groq_client(GROQ_API_KEY)
+    prepared=prepare_for_stt(segment=segment) if segment is not None else None
+    if prepared is None:
+        if _is_segment(original):
+            original=export(segment, "wav")
+        if isinstance(original, tuple):
+            s.set(payload_bytes=len(original[1]), chunks=1)
+            return _transcribe_upload(client, stt_model, original, language)
+        s.set(payload_bytes=os.path.getsize(original), chunks=1)
+        return _transcribe_upload(client, stt_model, original, language)
+
+    s.set(payload_bytes=prepared.upload_bytes, chunks=len(prepared.chunks))
+    # Chunk durations aren't kept; share the total out by encoded size.
+    seconds_per_byte=prepared.duration_ms / 1000 / max(1, prepared.upload_bytes)
+    if len(prepared.chunks) == 1:
+        return _transcribe_upload(client, stt_model, prepared.chunks[0], language, prepared.duration_ms / 1000)
+
+    def transcribe_chunk(chunk):
+        return _transcribe_upload(client, stt_model, chunk, language, len(chunk[1]) * seconds_per_byte)
+
+    with ThreadPoolExecutor(max_workers=STT_CHUNK_WORKERS) as pool:
+        texts=pool.map(transcribe_chunk, prepared.chunks)
+        return " ".join(text.strip() for text in texts if text and text.strip())
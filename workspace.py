@@ -0,0 +1,91 @@
+import os
+import time
+import uuid
+import tempfile
+import threading
+
+WORKSPACE_DIR = os.environ.get("AI_DOCTOR_WORKSPACE") or os.path.join(tempfile.gettempdir(), "ai_doctor_artifacts")
+# Artifacts older than this are deleted on the next collection.
+ARTIFACT_MAX_AGE = float(os.environ.get("ARTIFACT_MAX_AGE", "3600"))
+# Oldest artifacts are deleted until the workspace is back under this size.
+ARTIFACT_MAX_BYTES = int(os.environ.get("ARTIFACT_MAX_BYTES", str(512 * 1024 * 1024)))
+# Minimum seconds between two collections triggered by new_path.
+ARTIFACT_GC_INTERVAL = float(os.environ.get("ARTIFACT_GC_INTERVAL", "60"))
+
+
+class ArtifactWorkspace:
+    """
+    Directory of per-request output files with age- and size-based cleanup.
+
+    Every request gets its own file name, so concurrent users never overwrite
+    each other's audio. Old files are collected opportunistically when new
+    paths are handed out.
+
+    Args:
+        root: Directory holding the artifacts. Created if missing.
+        max_age: Seconds an artifact is kept.
+        max_bytes: Size the workspace is trimmed back to.
+        gc_interval: Minimum seconds between automatic collections.
+    """
+
+    def __init__(self, root=WORKSPACE_DIR, max_age=ARTIFACT_MAX_AGE,
+                 max_bytes=ARTIFACT_MAX_BYTES, gc_interval=ARTIFACT_GC_INTERVAL):
+        self.root = root
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.gc_interval = gc_interval
+        self._last_gc = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def new_path(self, prefix="artifact", suffix=".mp3"):
+        """Return a fresh, unique file path inside the workspace."""
+        if time.time() - self._last_gc > self.gc_interval:
+            self.gc()
+        return os.path.join(self.root, f"{prefix}_{uuid.uuid4().hex}{suffix}")
+
+    def gc(self):
+        """Delete expired artifacts, then the oldest ones until under max_bytes."""
+        with self._lock:
+            self._last_gc = time.time()
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if self._last_gc - stat.st_mtime > self.max_age:
+                    self._remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def usage(self):
+        """(file count, total bytes) currently in the workspace."""
+        count = 0
+        total = 0
+        for entry in os.scandir(self.root):
+            if entry.is_file():
+                count += 1
+                total += entry.stat().st_size
+        return count, total
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+workspace = ArtifactWorkspace()